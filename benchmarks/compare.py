@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""compare.py: Compares two benchmark result files."""
+
+__license__     = "MIT"
+__author__      = "José Fonseca"
+__copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
+
+
+# ======================================================================================================================
+# IMPORTS
+
+
+import sys
+import json
+
+
+# ======================================================================================================================
+# PAYLOAD
+
+
+PARAMETERS = ('benchmark', 'individual_size', 'population_size', 'input_size', 'rows')
+
+
+def load(path) -> dict:
+    with open(path, 'r') as file:
+        results = [json.loads(line) for line in file if line.strip()]
+    return {tuple(result.get(key) for key in PARAMETERS): result for result in results}
+
+
+def compare(baseline_path, candidate_path):
+    """ Speedup of the candidate over the baseline (> 1 is faster) for every case present in both files """
+    baseline, candidate = load(baseline_path), load(candidate_path)
+    for case in sorted(set(baseline) & set(candidate), key=str):
+        yield dict(zip(PARAMETERS, case), speedup=baseline[case]['seconds'] / candidate[case]['seconds'],
+                   baseline_seconds=baseline[case]['seconds'], candidate_seconds=candidate[case]['seconds'])
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit('USAGE: compare.py BASELINE.jsonl CANDIDATE.jsonl')
+    for row in compare(sys.argv[1], sys.argv[2]):
+        print(json.dumps(row))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""encoding.py: Benchmarks of the genotype encodings."""
+
+__license__     = "MIT"
+__author__      = "José Fonseca"
+__copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
+
+
+# ======================================================================================================================
+# IMPORTS
+
+
+import os
+import sys
+import json
+import random
+from timeit import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from symbolic_regression import operators
+from symbolic_regression.genotype import generate_decoded_genotype
+
+
+# ======================================================================================================================
+# PAYLOAD
+
+
+def benchmark_values(size=100000, seed=0, repeat=1):
+    values = np.random.default_rng(seed).uniform(-1e6, 1e6, size)
+    value_list = values.tolist()
+    encoded_list = [operators.encode_value(value) for value in value_list]
+    words = operators.encode_values(values)
+    return {
+        'values': size,
+        'encode_value': timeit(lambda: [operators.encode_value(value) for value in value_list], number=repeat),
+        'encode_values': timeit(lambda: operators.encode_values(values), number=repeat),
+        'decode_value': timeit(lambda: [operators.decode_value(value) for value in encoded_list], number=repeat),
+        'decode_values': timeit(lambda: operators.decode_values(words), number=repeat),
+    }
+
+
+def benchmark_genotypes(population_size=2000, individual_size=50, input_size=4, seed=0, repeat=1):
+    random.seed(seed)
+    population = [generate_decoded_genotype(individual_size, input_size) for _ in range(population_size)]
+    encoded_population = operators.encode_genotypes(population)
+    return {
+        'population_size': population_size, 'individual_size': individual_size,
+        'encode_genotype': timeit(lambda: [operators.encode_genotype(genotype) for genotype in population],
+                                  number=repeat),
+        'encode_genotypes': timeit(lambda: operators.encode_genotypes(population), number=repeat),
+        'decode_genotype': timeit(lambda: [operators.decode_genotype(genotype) for genotype in encoded_population],
+                                  number=repeat),
+        'decode_genotypes': timeit(lambda: operators.decode_genotypes(encoded_population), number=repeat),
+    }
+
+
+if __name__ == '__main__':
+    print(json.dumps(benchmark_values()))
+    print(json.dumps(benchmark_genotypes()))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""imports.py: Benchmarks of the import time of each module."""
+
+__license__     = "MIT"
+__author__      = "José Fonseca"
+__copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
+
+
+# ======================================================================================================================
+# IMPORTS
+
+
+import os
+import sys
+import json
+import argparse
+import platform
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ======================================================================================================================
+# SETTINGS
+# Each module is imported in a fresh interpreter, as a short-lived worker process would. The legacy package shares
+# its name with the new one, so it is imported with its own directory on the path
+
+
+MODULES = {
+    'numpy': ('numpy', ROOT),
+    'symbolic_regression': ('symbolic_regression', ROOT),
+    'symbolic_regression.operators': ('symbolic_regression.operators', ROOT),
+    'symbolic_regression.population': ('symbolic_regression.population', ROOT),
+    'symbolic_regression.engine': ('symbolic_regression.engine', ROOT),
+    'symbolic_regression.parallel': ('symbolic_regression.parallel', ROOT),
+    'symbolic_regression.distributed': ('symbolic_regression.distributed', ROOT),
+    'deprecated.symbolic_regression': ('symbolic_regression', os.path.join(ROOT, 'deprecated')),
+}
+
+# Optional dependencies that no module should load at import
+HEAVY_MODULES = ('pandas', 'scipy')
+
+_CHILD = '''
+import sys
+from time import perf_counter
+start = perf_counter()
+import {module}
+seconds = perf_counter() - start
+print(seconds, ','.join(sorted(name for name in {heavy!r} if name in sys.modules)))
+'''
+
+
+# ======================================================================================================================
+# HARNESS
+
+
+def commit_id():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def import_seconds(module, path) -> tuple:
+    """ Time to import the module in a fresh interpreter, and the heavy modules it loaded """
+    result = subprocess.run([sys.executable, '-c', _CHILD.format(module=module, heavy=HEAVY_MODULES)], cwd=path,
+                            capture_output=True, text=True, check=True)
+    seconds, _, heavy = result.stdout.strip().partition(' ')
+    return float(seconds), [name for name in heavy.split(',') if name]
+
+
+def run(names=None, repeat=5):
+    """ Yields one result per module, keeping the best of repeat imports """
+    environment = {'commit': commit_id(), 'python': platform.python_version()}
+    for name in (names or MODULES):
+        timings = [import_seconds(*MODULES[name]) for _ in range(repeat)]
+        yield dict(environment, benchmark='import:{}'.format(name), seconds=min(timing[0] for timing in timings),
+                   heavy_modules=timings[0][1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import time benchmarks. Writes one JSON object per line.')
+    parser.add_argument('--module', action='append', choices=sorted(MODULES), help='Default: all of them')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='JSON-lines file to append to. Default: standard output')
+    arguments = parser.parse_args()
+
+    output = open(arguments.output, 'a') if arguments.output else sys.stdout
+    for result in run(arguments.module, arguments.repeat):
+        output.write(json.dumps(result) + '\n')
+        output.flush()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""legacy.py: Benchmark of the legacy engine, run in its own process."""
+
+__license__     = "MIT"
+__author__      = "José Fonseca"
+__copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
+
+
+# ======================================================================================================================
+# IMPORTS
+
+
+import os
+import sys
+import json
+import random
+from time import perf_counter
+
+# The legacy package shares its name with the new one, so it runs in its own process (see run.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'deprecated'))
+
+import numpy as np
+
+from symbolic_regression import Environment
+
+
+# ======================================================================================================================
+# PAYLOAD
+
+
+def benchmark_epoch(population_size, individual_size, rows, epochs, seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    environment = Environment({
+        'population_size': population_size, 'individual_size': individual_size,
+        'numerical_value_max': 10, 'targets_max': 3, 'fitness_function': 'RMSE',
+        'selection_function': 'TOURNAMENT', 'selection_group_size': 3, 'selection_population_size': population_size,
+        'elitism_size': 2, 'crossover_function': 'RANDOM_REPRODUCTION', 'mutation_target_probability': 0.0,
+        'mutation_type_probability': 0.2, 'mutation_constants_factor_max': 2.0,
+    })
+    inputs = list(np.linspace(-1.0, 1.0, rows))
+    outputs = [2.0 * value + 1.0 for value in inputs]
+
+    # Environment.update_statistics imports scipy on first use, which would take most of the time of a short run
+    import scipy.stats
+
+    start = perf_counter()
+    for _ in range(epochs):
+        environment.epoch(inputs, outputs, inplace=True)
+    return perf_counter() - start
+
+
+if __name__ == '__main__':
+    parameters = json.loads(sys.argv[1])
+    print(json.dumps({'seconds': benchmark_epoch(**parameters)}))
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""run.py: Benchmarks of the evaluation and evolution of populations."""
+
+__license__     = "MIT"
+__author__      = "José Fonseca"
+__copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
+
+
+# ======================================================================================================================
+# IMPORTS
+
+
+import os
+import sys
+import json
+import random
+import argparse
+import platform
+import warnings
+import subprocess
+from time import perf_counter
+from itertools import product
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from symbolic_regression import operators
+from symbolic_regression.genotype import generate_decoded_genotype, evaluate_decoded_genotype, \
+    mutate_decoded_genotype
+from symbolic_regression.population import fitness_decoded_genotype, fitness_decoded_population
+
+
+# ======================================================================================================================
+# SETTINGS
+# Each benchmark runs once per combination of its grid. Every run is seeded, so results are comparable between commits
+
+
+GRIDS = {
+    'full': {
+        'individual_size': [8, 32, 128],
+        'population_size': [100, 1000],
+        'input_size': [1, 4],
+        'rows': [1000, 100000],
+    },
+    'quick': {
+        'individual_size': [8, 32],
+        'population_size': [100],
+        'input_size': [1, 4],
+        'rows': [1000],
+    },
+}
+
+# The scalar evaluator walks every reference of every gene, per row, and the number of references grows
+# exponentially with chains of two-argument genes. It is only timed on small cases, with a slice of the dataset
+SCALAR_INDIVIDUAL_SIZE_MAX = 12
+SCALAR_POPULATION_SIZE_MAX = 20
+SCALAR_ROWS_MAX = 100
+
+
+# ======================================================================================================================
+# BENCHMARKS
+# Each benchmark returns the number of operations it timed and the time it took, in seconds
+
+
+def _population(population_size, individual_size, input_size, seed):
+    random.seed(seed)
+    return [generate_decoded_genotype(individual_size, input_size) for _ in range(population_size)]
+
+
+def _dataset(rows, input_size, seed):
+    input_array = np.random.default_rng(seed).uniform(-1.0, 1.0, (rows, input_size))
+    return input_array, input_array[:, 0] ** 2 + input_array.sum(axis=1)
+
+
+def _timed(function, *args):
+    start = perf_counter()
+    function(*args)
+    return perf_counter() - start
+
+
+def benchmark_generate(individual_size, population_size, input_size, seed, **_):
+    random.seed(seed)
+    return population_size, _timed(lambda: [generate_decoded_genotype(individual_size, input_size)
+                                            for _ in range(population_size)])
+
+
+def benchmark_evaluate_scalar(individual_size, population_size, input_size, rows, seed, **_):
+    if individual_size > SCALAR_INDIVIDUAL_SIZE_MAX:
+        return None
+    population = _population(min(population_size, SCALAR_POPULATION_SIZE_MAX), individual_size, input_size, seed)
+    input_array, _ = _dataset(min(rows, SCALAR_ROWS_MAX), input_size, seed)
+    return len(population) * len(input_array), _timed(lambda: [evaluate_decoded_genotype(genotype, *row)
+                                                               for genotype in population
+                                                               for row in input_array.tolist()])
+
+
+def benchmark_fitness_genotype(individual_size, population_size, input_size, rows, seed, **_):
+    population = _population(population_size, individual_size, input_size, seed)
+    input_array, output_array = _dataset(rows, input_size, seed)
+    return len(population) * rows, _timed(lambda: [fitness_decoded_genotype(genotype, input_array, output_array, 'RMSE')
+                                                   for genotype in population])
+
+
+def benchmark_fitness_population(individual_size, population_size, input_size, rows, seed, **_):
+    population = _population(population_size, individual_size, input_size, seed)
+    input_array, output_array = _dataset(rows, input_size, seed)
+    batch_size = max(1, 2**27 // (rows * 8))  # Bound the output matrix to 128MB
+    return len(population) * rows, _timed(fitness_decoded_population, population, input_array, output_array, 'RMSE',
+                                          batch_size)
+
+
+def benchmark_mutate(individual_size, population_size, input_size, seed, **_):
+    population = _population(population_size, individual_size, input_size, seed)
+    return len(population), _timed(lambda: [mutate_decoded_genotype(genotype, input_size) for genotype in population])
+
+
+def benchmark_encode(individual_size, population_size, input_size, seed, **_):
+    population = _population(population_size, individual_size, input_size, seed)
+    return len(population), _timed(lambda: [operators.encode_genotype(genotype) for genotype in population])
+
+
+def benchmark_decode(individual_size, population_size, input_size, seed, **_):
+    population = [operators.encode_genotype(genotype)
+                  for genotype in _population(population_size, individual_size, input_size, seed)]
+    return len(population), _timed(lambda: [operators.decode_genotype(genotype) for genotype in population])
+
+
+def benchmark_legacy_epoch(individual_size, population_size, input_size, rows, seed, **_):
+    """ The deprecated Environment.epoch, as a baseline. It has a single input, and runs in its own process """
+    if (input_size > 1) or (individual_size > SCALAR_INDIVIDUAL_SIZE_MAX):
+        return None
+    parameters = {'population_size': min(population_size, SCALAR_POPULATION_SIZE_MAX),
+                  'individual_size': individual_size, 'rows': min(rows, SCALAR_ROWS_MAX), 'epochs': 2, 'seed': seed}
+    result = subprocess.run([sys.executable, os.path.join(ROOT, 'benchmarks', 'legacy.py'), json.dumps(parameters)],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        warnings.warn('LEGACY BENCHMARK FAILED: {}'.format(result.stderr.strip().splitlines()[-1:]))
+        return None
+    return parameters['population_size'] * parameters['rows'] * parameters['epochs'], \
+        json.loads(result.stdout)['seconds']
+
+
+BENCHMARKS = {
+    'generate_decoded_genotype': benchmark_generate,
+    'evaluate_decoded_genotype': benchmark_evaluate_scalar,
+    'fitness_decoded_genotype': benchmark_fitness_genotype,
+    'fitness_decoded_population': benchmark_fitness_population,
+    'mutate_decoded_genotype': benchmark_mutate,
+    'encode_genotype': benchmark_encode,
+    'decode_genotype': benchmark_decode,
+    'legacy_environment_epoch': benchmark_legacy_epoch,
+}
+
+
+# ======================================================================================================================
+# HARNESS
+
+
+def commit_id():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(grid, names=None, seed=0, repeat=3):
+    """ Yields one result per benchmark and grid combination, keeping the best of repeat runs """
+    environment = {'commit': commit_id(), 'python': platform.python_version(), 'numpy': np.__version__}
+    keys = sorted(grid)
+    for name in (names or BENCHMARKS):
+        for values in product(*[grid[key] for key in keys]):
+            parameters = dict(zip(keys, values))
+            timings = [BENCHMARKS[name](seed=seed, **parameters) for _ in range(repeat)]
+            if timings[0] is None:
+                continue
+            operations = timings[0][0]
+            seconds = min(timing[1] for timing in timings)
+            yield dict(environment, benchmark=name, seed=seed, seconds=seconds, operations=operations,
+                       operations_per_second=operations / seconds if seconds > 0 else None, **parameters)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Throughput benchmarks. Writes one JSON object per line.')
+    parser.add_argument('--grid', choices=sorted(GRIDS), default='quick')
+    parser.add_argument('--benchmark', action='append', choices=sorted(BENCHMARKS), help='Default: all of them')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='JSON-lines file to append to. Default: standard output')
+    arguments = parser.parse_args()
+
+    warnings.simplefilter('ignore', RuntimeWarning)  # Invalid operations are part of the search space
+    output = open(arguments.output, 'a') if arguments.output else sys.stdout
+    for result in run(GRIDS[arguments.grid], arguments.benchmark, arguments.seed, arguments.repeat):
+        output.write(json.dumps(result) + '\n')
+        output.flush()
@@ -34,10 +34,18 @@ class Constant(Node):
     def operation(self, input, *args) -> float:
         return self._value
 
-    def mutation(self) -> list:
+    def value_mutation(self) -> float:
         if random() < self._env.mutation_target:
-            self._value = self._value * ((1 if random() > 0.5 else -1) * random() * self._env.mutation_constants_factor_max)
-        return []
+            return self._value * ((1 if random() > 0.5 else -1) * random() * self._env.mutation_constants_factor_max)
+        return self._value
+
+    def mutated(self):
+        value = self.value_mutation()
+        if value == self._value:
+            return self
+        other = self.copy()
+        other._value = value
+        return other
 
     def __repr__(self):
         return self.symbol.replace('<', '<[{}] '.format(self._position)).replace('>', ' (${}...)>'.format(round(self._value, 3)))
@@ -57,4 +65,4 @@ class Sum(Node):
         return [randint(start, end) for _ in range(min(randint(2, quantity), end-start+1))]
 
     def operation(self, input, *args) -> float:
-        return sum([t.operate(input) for t in self.targets()])
+        return sum(args)  # The values of the targets, computed once each by operate or evaluate
@@ -15,11 +15,9 @@ __copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
 import os
 import json
 from hashlib import sha1
-from copy import deepcopy
-from random import shuffle, choice
+from contextlib import nullcontext
+from random import shuffle, choice, randint
 
-from pandas import DataFrame
-from scipy.stats import kurtosis, skew as skewness
 from numpy import array, float64, nan, subtract, power, sum, random, max, min, mean, std, percentile
 
 from symbolic_regression import Individual
@@ -31,9 +29,13 @@ from symbolic_regression import Individual
 
 class Environment(object):
 
-    def __init__(self, configuration, starter_population=None):
+    def __init__(self, configuration, starter_population=None, instrumentation=None):
         self.parse_configuration(configuration)
 
+        # Optional symbolic_regression.instrumentation.Instrumentation, fed by epoch, with the number of epochs run
+        self.instrumentation = instrumentation
+        self.generation = 0
+
         self.input = nan
         self.output = nan
 
@@ -53,7 +55,6 @@ class Environment(object):
                 configuration = json.loads(configuration)
 
         self.population_size = int(configuration['population_size'])
-        self.validity_attempts = int(configuration['validity_attempts'])
         self.individual_size = int(configuration['individual_size'])
         self.numerical_value_max = float(configuration['numerical_value_max'])
         self.targets_max = int(configuration['targets_max'])
@@ -76,16 +77,16 @@ class Environment(object):
         inputs = array([float64(value) for value in inputs])
         outputs = array([float64(value) for value in outputs])
 
-        # Compute the fitness of each individual in each input
-        fitness = DataFrame([deepcopy([chromo.output(inpu) for chromo in self.population]) for inpu in inputs])
+        # Compute the output of each individual for all the inputs at once
+        fitness = array([chromo.outputs(inputs) for chromo in self.population])
 
-        # Here, the fitness is a dataframe with ONE COLUMN PER INDIVIDUAL/CHROMOSSOME and ONE ROW PER INPUT
+        # Here, the fitness is a matrix with ONE ROW PER INDIVIDUAL/CHROMOSSOME and ONE COLUMN PER INPUT
         if self.fitness_function_name in {'MSE', 'MSD', 'MEAN_SQUARE_ERROR', 'MEAN_SQUARE_DEVIATION',
                                           'MEAN_SQUARED_ERROR', 'MEAN_SQUARED_DEVIATION'}:
-            fitness = fitness.apply(lambda col: power(subtract(outputs, col), 2).mean())  # evaluate each column
+            fitness = power(subtract(outputs, fitness), 2).mean(axis=1)  # evaluate each row
         elif self.fitness_function_name in {'RMSE', 'RMSD', 'ROOT_MEAN_SQUARE_ERROR', 'ROOT_MEAN_SQUARE_DEVIATION',
                                             'ROOT_MEAN_SQUARED_ERROR', 'ROOT_MEAN_SQUARED_DEVIATION'}:
-            fitness = fitness.apply(lambda col: power(power(subtract(outputs, col), 2).mean(), 1/2))  # evaluate each column
+            fitness = power(power(subtract(outputs, fitness), 2).mean(axis=1), 1/2)  # evaluate each row
         else:
             raise TypeError('UNKNOWN FITNESS FUNCTION: {}'.format(self.fitness_function_name))
 
@@ -163,11 +164,35 @@ class Environment(object):
     def random_reprodution_crossover(self, crossing_population: list, target_population_size: int):
         return [self.population[choice(crossing_population)].copy() for _ in range(target_population_size)]
 
+    def cross_individuals(self, parent_a, parent_b, from_parent_a: list):
+
+        # Share each gene of the chosen parent, as genes are never changed in place
+        child = Individual(self, chromossome=[
+            (parent_a if from_a else parent_b)[position] for position, from_a in enumerate(from_parent_a)
+        ])
+
+        # Positions are kept, so the targets are still in range. Still, the child may not reach an input
+        child.repair()
+        return child
+
     def single_point_crossover(self, crossing_population: list, target_population_size: int):
-        raise NotImplementedError('TODO')
+        children = []
+        for _ in range(target_population_size):
+            point = randint(1, self.individual_size-1)
+            children.append(self.cross_individuals(
+                self.population[choice(crossing_population)], self.population[choice(crossing_population)],
+                [position < point for position in range(self.individual_size)]
+            ))
+        return children
 
     def uniform_crossover(self, crossing_population: list, target_population_size: int):
-        raise NotImplementedError('TODO')
+        return [
+            self.cross_individuals(
+                self.population[choice(crossing_population)], self.population[choice(crossing_population)],
+                [random.random() < 0.5 for _ in range(self.individual_size)]
+            )
+            for _ in range(target_population_size)
+        ]
 
     def apply_crossover(self, crossing_population: list, target_population_size: int):
 
@@ -206,22 +231,39 @@ class Environment(object):
         return [self.population[el[1]].copy()
                 for el in sorted(zip(fitness, range(len(self.population))))[:self.elitism_size]]
 
-    def epoch(self, inputs, outputs, inplace=False):
-
-        # Apply the fitness function and compute the selected population as an array of POSITIONS of elements
-        fitness = self.fit(inputs, outputs)
-        new_population_pointers = self.apply_selection(fitness)
-
-        # Apply crossover on the selected population until we have a whole new population (applying elitism as needed)
-        # Here, the selected population is an array of INTEGERS, representing the POSITIONS of each Individual object
-        # in the popullation array
-        new_population_objects = self.apply_crossover(new_population_pointers, self.population_size - self.elitism_size)
+    def _phase(self, name):
+        return nullcontext() if self.instrumentation is None else self.instrumentation.phase(name)
 
-        # Apply mutation to the new population. Here, the new population is an array of new Individual objects
-        new_population_objects = self.apply_mutation(new_population_objects)
-
-        # Apply elitism to the new population
-        new_population_objects += self.elitism(fitness)
+    def epoch(self, inputs, outputs, inplace=False):
+        with self._phase('generation'):
+
+            # Apply the fitness function and compute the selected population as an array of POSITIONS of elements
+            with self._phase('fitness'):
+                fitness = self.fit(inputs, outputs)
+            with self._phase('selection'):
+                new_population_pointers = self.apply_selection(fitness)
+
+            # Apply crossover on the selected population until we have a whole new population (applying elitism as
+            # needed). Here, the selected population is an array of INTEGERS, representing the POSITIONS of each
+            # Individual object in the popullation array
+            with self._phase('crossover'):
+                new_population_objects = self.apply_crossover(
+                    new_population_pointers, self.population_size - self.elitism_size
+                )
+
+            # Apply mutation to the new population. Here, the new population is an array of new Individual objects
+            with self._phase('mutation'):
+                new_population_objects = self.apply_mutation(new_population_objects)
+
+            # Apply elitism to the new population
+            new_population_objects += self.elitism(fitness)
+
+        if self.instrumentation is not None:
+            self.instrumentation.end_generation(
+                self.generation, population_size=len(new_population_objects), best_fitness=float(min(fitness)),
+                validity_attempts=int(sum([chromo.validity_attempts for chromo in new_population_objects]))
+            )
+        self.generation += 1
 
         # Set the new population
         if inplace:
@@ -231,6 +273,7 @@ class Environment(object):
             return new_population_objects
 
     def update_statistics(self, fitness):
+        from scipy.stats import kurtosis, skew as skewness  # Imported on first use, as pandas is
         self._statistics.append({
             'min': min(fitness), 'max': max(fitness), 'mean': mean(fitness), 'std': std(fitness),
             'skewness': skewness(fitness), 'kurtosis': kurtosis(fitness),
@@ -240,4 +283,6 @@ class Environment(object):
         })
 
     @property
-    def statistics(self): return DataFrame(self._statistics)
+    def statistics(self):
+        from pandas import DataFrame
+        return DataFrame(self._statistics)
@@ -15,6 +15,8 @@ __copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
 from hashlib import sha1
 from random import choice, randint
 
+from numpy import asarray, broadcast_to, float64
+
 from symbolic_regression.node import Node, Empty, Input
 from symbolic_regression.basic import Constant, Sum
 
@@ -39,16 +41,13 @@ class Individual(object):
 
     def __init__(self, environment, chromossome=None):
         self._env = environment
-        max_validity_attempts = self._env.validity_attempts if (chromossome is None) else 0
+
+        # Number of genes changed by repair to make the individual valid, instead of the old regeneration attempts
         self.validity_attempts = 0
-        if max_validity_attempts < 1:
-            self._chromossome = self.create(chromossome)
-        else:
-            for validity_attempt in range(self._env.validity_attempts):
-                self._chromossome = self.create()
-                self.validity_attempts += 1
-                if self.is_valid(): break
-            assert self.is_valid(), 'UNABLE TO CREATE VALID INDIVIDUAL IN {} ATTEMPTS!'.format(self.validity_attempts)
+        self._chromossome = self.create(chromossome)
+        self._owns_chromossome = True  # False while the chromosome is shared with copies (see copy and _write)
+        if chromossome is None:
+            self.repair()
 
     def available_nodes(self, position):
         return [
@@ -68,9 +67,64 @@ class Individual(object):
             chromo[position] = Input(self, position)
         return chromo
 
+    def _write(self, position, gene):
+        """ Set a gene, copying the chromosome first if it is shared. Genes themselves are never changed in place """
+        if not self._owns_chromossome:
+            self._chromossome = list(self._chromossome)
+            self._owns_chromossome = True
+        gene._chromo = self
+        self._chromossome[position] = gene
+
+    def _root_position(self):
+        for position, gene in enumerate(self._chromossome):
+            if isinstance(gene, tuple(OPERATION_NODES)):
+                return position
+        return None
+
+    def _reachable_positions(self, root_position) -> list:
+        reachable = set()
+        pending = [root_position]
+        while pending:
+            position = pending.pop()
+            if position not in reachable:
+                reachable.add(position)
+                pending.extend(self._chromossome[position]._targets)
+        return sorted(reachable)
+
+    def repair(self):
+        """
+        Make the individual valid by changing as few genes as possible, in a single pass over the genes reachable
+        from the root: a root <SUM> is created if there is none, the empty genes reached by the tree become inputs or
+        constants, and one reached constant becomes an input if the tree reaches none. Targets always point forward,
+        so replacing a terminal never changes what else is reachable. Returns the number of changed genes.
+        """
+        changed = 0
+        root_position = self._root_position()
+        if root_position is None:
+            positions = [position for position in range(len(self._chromossome))
+                         if position+Sum.MIN_QUANTITY_OF_TARGETS < self._env.individual_size]
+            assert positions, 'INDIVIDUAL OF SIZE {} IS TOO SMALL FOR A <SUM>!'.format(self._env.individual_size)
+            root_position = choice(positions)
+            self._write(root_position, Sum(self, root_position))
+            changed += 1
+
+        reachable = self._reachable_positions(root_position)
+        for position in reachable:
+            if self._chromossome[position].symbol in {'<>', '<EMPTY>'}:
+                self._write(position, choice([Input, Constant])(self, position))
+                changed += 1
+
+        if not any(self._chromossome[position].symbol == '<INPUT>' for position in reachable):
+            position = choice([position for position in reachable if self._chromossome[position].symbol == '<CONST>'])
+            self._write(position, Input(self, position))
+            changed += 1
+
+        self.validity_attempts += changed
+        return changed
+
     def _visit_gene(self, gene):
         yield gene
-        for target in gene.targets():
+        for target in gene.targets(self):
             for sub_gene in self._visit_gene(target):
                 yield sub_gene
 
@@ -84,41 +138,44 @@ class Individual(object):
     def is_valid(self):
         input_reached = False
         for pos, gene in enumerate(self.tree()):
-            if not gene.is_valid():
+            if not gene.is_valid(self):
                 return False
             if (pos > 0) and (gene.symbol == '<INPUT>'):
                 input_reached = True
         return input_reached
 
     def output(self, input) -> float:
-        return next(self.tree()).operate(input)
+        return next(self.tree()).operate(input, self)
+
+    def evaluation_order(self) -> list:
+        """
+        The positions reachable from the root, each once. Targets always point forward, so in descending order every
+        gene comes after all of its targets, however many genes share them.
+        """
+        root_position = self._root_position()
+        assert root_position is not None, 'INDIVIDUAL WITHOUT A <SUM> CANNOT BE EVALUATED!'
+        return self._reachable_positions(root_position)[::-1]
+
+    def outputs(self, inputs):
+        """ Same as [self.output(input) for input in inputs], evaluating each reachable gene once over all inputs """
+        inputs = asarray(inputs, dtype=float64)
+        values = [None] * len(self._chromossome)
+        order = self.evaluation_order()
+        for position in order:
+            values[position] = self._chromossome[position].evaluate(inputs, values)
+        return broadcast_to(values[order[-1]], inputs.shape).astype(float64)
 
     def mutate_target(self):
-
-        for gene in self._chromossome:
-            gene.mutate()
-        attempt = 0
-        for attempt in range(self.validity_attempts):
-            if self.is_valid():
-                break
-            else:
-                for gene in self._chromossome:
-                    gene.mutate()
-        assert self.is_valid(), 'FAILURE TO MUTATE TO A VALID INDIVIDUAL IN {} ATTEMPTS!'.format(attempt)
-        self.validity_attempts += attempt
+        for position, gene in enumerate(self._chromossome):
+            mutated = gene.mutated()
+            if mutated is not gene:
+                self._write(position, mutated)
+        self.repair()
 
     def mutate_type(self):
-
         position = randint(0, self._env.individual_size-1)
-        self._chromossome[position] = choice(self.available_nodes(position))(self, position)
-        attempt = 0
-        for attempt in range(self._env.validity_attempts):
-            if self.is_valid():
-                break
-            else:
-                self._chromossome[position] = choice(self.available_nodes(position))(self, position)
-        assert self.is_valid(), 'FAILURE TO MUTATE TO A VALID INDIVIDUAL IN {} ATTEMPTS!'.format(attempt)
-        self.validity_attempts += attempt
+        self._write(position, choice(self.available_nodes(position))(self, position))
+        self.repair()
 
     def print(self, genotype=True) -> str:
         if genotype:
@@ -139,7 +196,11 @@ class Individual(object):
 
     def __repr__(self): return '<Individual {}>'.format(self.id)
     def __getitem__(self, item) -> Node: return self._chromossome[item]
-    def __setitem__(self, key, value) -> None: self._chromossome[key] = value
+    def __setitem__(self, key, value) -> None: self._write(key, value)
     def __sizeof__(self) -> int: return len(self._chromossome)
 
-    def copy(self): return Individual(self._env, chromossome=[gene.copy() for gene in self._chromossome])
+    def copy(self):
+        """ The copy shares the chromosome, until either of them writes a gene """
+        other = Individual(self._env, chromossome=self._chromossome)
+        self._owns_chromossome = other._owns_chromossome = False
+        return other
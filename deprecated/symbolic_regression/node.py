@@ -13,7 +13,6 @@ __copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
 
 
 import abc
-from copy import deepcopy
 from random import randint
 
 from numpy import random
@@ -21,6 +20,9 @@ from numpy import random
 
 # ======================================================================================================================
 # PAYLOAD - NODE
+# Genes are never changed once in a chromosome, so individuals can share them (see Individual.copy): mutated returns
+# a changed copy instead. A gene may be shared by many individuals, so its targets are resolved through the individual
+# being evaluated. The individual the gene was created for, _chromo, is only the default.
 
 
 class Node(abc.ABC):
@@ -50,18 +52,29 @@ class Node(abc.ABC):
                 new_targets.append(target)
         return new_targets
 
-    def mutate(self):
-        self._targets = self.mutation()
+    def mutated(self):
+        """ The gene after a mutation: itself if nothing changed, otherwise a mutated copy """
+        targets = self.mutation()
+        if targets == self._targets:
+            return self
+        other = self.copy()
+        other._targets = targets
+        return other
 
-    def targets(self):
+    def targets(self, individual=None):
+        chromo = self._chromo if individual is None else individual
         for target_position in self._targets:
-            yield self._chromo[target_position]
+            yield chromo[target_position]
+
+    def operate(self, input, individual=None) -> float:
+        return self.operation(input, *[t.operate(input, individual) for t in self.targets(individual)])
 
-    def operate(self, input) -> float:
-        return self.operation(input, *[t.operate(input) for t in self.targets()])
+    def evaluate(self, inputs, values):
+        """ Same as operate, over the whole inputs array, reading the values already computed at the targets """
+        return self.operation(inputs, *[values[target] for target in self._targets])
 
-    def is_valid(self) -> bool:
-        return all([t.symbol not in {'<>', '<EMPTY>'} for t in self.targets()])
+    def is_valid(self, individual=None) -> bool:
+        return all([t.symbol not in {'<>', '<EMPTY>'} for t in self.targets(individual)])
 
     @property
     def position(self) -> int: return self._position
@@ -69,9 +82,9 @@ class Node(abc.ABC):
     def symbol(self) -> str: return self._symbol
 
     def copy(self):
-        other = self.__class__(self._chromo, self._position)
-        other._targets = deepcopy(self._targets)
-        other._value = self._value
+        """ Shallow copy, without create's random draws. The targets list is replaced, never changed in place """
+        other = self.__class__.__new__(self.__class__)
+        other.__dict__.update(self.__dict__)
         return other
 
     def __repr__(self):
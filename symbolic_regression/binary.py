@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""binary.py: Genotypes as fixed-width binary words, with bitwise crossover and mutation."""
+
+__license__     = "MIT"
+__author__      = "José Fonseca"
+__copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
+
+
+# ======================================================================================================================
+# IMPORTS
+
+
+from functools import lru_cache
+
+import numpy as np
+
+from symbolic_regression import operators
+from symbolic_regression.genome import genome_dtype, pack_decoded_population, unpack_population
+from symbolic_regression.population import REPRODUCTION_NAMES, SINGLE_POINT_NAMES, UNIFORM_NAMES
+
+
+# ======================================================================================================================
+# BINARY POPULATIONS
+# A binary population is a (population x genes) uint64 matrix, with one encoded word per gene (see
+# operators.encode_values). Its rows are the bits of operators.encode_genotype, packed 8 bytes per gene.
+
+
+# Operators and inputs are encoded by their opcodes, so decoding must know how many inputs there are: a word that is
+# not the opcode of an operator or of an existing input is a constant. The default covers INPUT_0 to INPUT_9, as the
+# encoding tables of operators.py do
+ENCODED_INPUTS = 10
+
+
+@lru_cache(maxsize=None)
+def _operator_words(input_size) -> tuple:
+    """ Encoded words of the operators and inputs, sorted, and their opcodes """
+    opcodes = np.arange(operators.OPCODE_INPUT + input_size, dtype=np.int16)
+    words = operators.encode_values(opcodes)
+    order = np.argsort(words)
+    return words[order], opcodes[order]
+
+
+def encode_binary_population(decoded_population, input_size=ENCODED_INPUTS) -> np.ndarray:
+    return genomes_to_words(pack_decoded_population(decoded_population), input_size)
+
+
+def decode_binary_population(words, input_size=ENCODED_INPUTS) -> list:
+    return unpack_population(words_to_genomes(np.asarray(words, dtype=np.uint64), input_size))
+
+
+def genomes_to_words(genomes, input_size=ENCODED_INPUTS) -> np.ndarray:
+    """ Encode a packed population (see genome.py). Operators are encoded by their opcodes, as in encode_genotype """
+    if (genomes['opcodes'] >= operators.OPCODE_INPUT + input_size).any():
+        raise ValueError('GENOMES READ INPUTS BEYOND THE INPUT SIZE: {}'.format(input_size))
+    is_constant = genomes['opcodes'] == operators.OPCODE_CONSTANT
+    return operators.encode_values(np.where(is_constant, genomes['constants'], genomes['opcodes']))
+
+
+def words_to_genomes(words, input_size=ENCODED_INPUTS) -> np.ndarray:
+    """ Decode a binary population into a packed population (see genome.py) """
+    operator_words, operator_opcodes = _operator_words(input_size)
+    positions = np.minimum(np.searchsorted(operator_words, words), len(operator_words) - 1)
+    is_operator = operator_words[positions] == words
+
+    genomes = np.zeros(words.shape[0], dtype=genome_dtype(words.shape[1]))
+    genomes['opcodes'] = np.where(is_operator, operator_opcodes[positions], operators.OPCODE_CONSTANT)
+    genomes['constants'] = np.where(is_operator, 0.0, operators.decode_values(words))
+    return genomes
+
+
+def valid_words(words, input_size=1) -> np.ndarray:
+    """
+    Mask of the words that are valid genes at their positions: the last gene must be a terminal,
+    and the one before it must not take two arguments. Words of missing inputs decode as constants
+    """
+    opcodes = words_to_genomes(words, input_size)['opcodes'].astype(np.intp)
+    arity = np.where((opcodes >= 0) & (opcodes < operators.OPCODE_INPUT),
+                     np.asarray(operators.OPERATOR_ARITY)[np.clip(opcodes, 0, operators.OPCODE_INPUT-1)], 0)
+    max_arity = np.full(words.shape[1], 2)
+    max_arity[-2:] = [1, 0][-words.shape[1]:]
+    return arity <= max_arity
+
+
+# ======================================================================================================================
+# CROSSOVER
+# Each child takes the bits of a word from its first parent where the mask is set, and from the second elsewhere
+
+
+def _cross(words, parents_a, parents_b, masks):
+    return (words[parents_a] & masks) | (words[parents_b] & ~masks)
+
+
+def _pick_parents(crossing_positions, target_population_size, rng):
+    return rng.choice(crossing_positions, (2, target_population_size))
+
+
+def random_reproduction_binary_crossover(words, crossing_positions, target_population_size, rng):
+    return words[rng.choice(crossing_positions, target_population_size)]
+
+
+def single_point_binary_crossover(words, crossing_positions, target_population_size, rng):
+    """ Genes before a random point come from the first parent and the rest from the second """
+    parents_a, parents_b = _pick_parents(crossing_positions, target_population_size, rng)
+    points = rng.integers(1, max(2, words.shape[1]), (target_population_size, 1))
+    masks = np.where(np.arange(words.shape[1]) < points, ~np.uint64(0), np.uint64(0))
+    return _cross(words, parents_a, parents_b, masks)
+
+
+def uniform_binary_crossover(words, crossing_positions, target_population_size, rng):
+    """ Each gene comes from either parent with the same probability """
+    parents_a, parents_b = _pick_parents(crossing_positions, target_population_size, rng)
+    masks = np.where(rng.random((target_population_size, words.shape[1])) < 0.5, ~np.uint64(0), np.uint64(0))
+    return _cross(words, parents_a, parents_b, masks)
+
+
+def apply_binary_crossover(words, crossing_positions, target_population_size, crossover_function_name, rng):
+    if crossover_function_name in REPRODUCTION_NAMES:
+        crossover_function = random_reproduction_binary_crossover
+    elif crossover_function_name in SINGLE_POINT_NAMES:
+        crossover_function = single_point_binary_crossover
+    elif crossover_function_name in UNIFORM_NAMES:
+        crossover_function = uniform_binary_crossover
+    else:
+        raise TypeError('UNKNOWN CROSSOVER FUNCTION: {}'.format(crossover_function_name))
+    return crossover_function(words, crossing_positions, target_population_size, rng)
+
+
+# ======================================================================================================================
+# MUTATION
+
+
+def bitflip_mutation(words, bit_probability, rng, input_size=1):
+    """ Flip each bit with the given probability, undoing flips that make a gene invalid (see valid_words) """
+    # The Gray code and the interleaving of encode_value keep single flips of constants close to the original
+    flips = rng.binomial(words.size * 64, bit_probability)
+    bits = rng.integers(0, words.size * 64, flips)
+    masks = np.zeros(words.size, dtype=np.uint64)
+    np.bitwise_xor.at(masks, bits // 64, np.left_shift(np.uint64(1), (bits % 64).astype(np.uint64)))
+
+    mutated = words ^ masks.reshape(words.shape)
+    return np.where(valid_words(mutated, input_size), mutated, words)
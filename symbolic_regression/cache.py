@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""cache.py: Caches of evaluated subexpressions and of the fitness of whole individuals."""
+
+__license__     = "MIT"
+__author__      = "José Fonseca"
+__copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
+
+
+# ======================================================================================================================
+# IMPORTS
+
+
+from hashlib import blake2b
+from collections import Counter, OrderedDict, namedtuple
+
+from numpy import asarray, empty, float64, ndarray
+
+
+# ======================================================================================================================
+# PAYLOAD
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'currsize', 'nbytes', 'max_bytes'])
+FitnessCacheInfo = namedtuple('FitnessCacheInfo', ['hits', 'misses', 'duplicates', 'evictions', 'currsize', 'maxsize'])
+
+
+def dataset_fingerprint(*arrays) -> bytes:
+    """ Digest of the shape, type and contents of the given arrays. Identifies a dataset for the caches """
+    digest = blake2b(digest_size=16)
+    for array in arrays:
+        digest.update('{}{}'.format(array.shape, array.dtype).encode('utf-8'))
+        digest.update(array.tobytes())
+    return digest.digest()
+
+
+class SubtreeCache(object):
+    """ LRU cache of the columns of evaluated subexpressions, keyed by genotype.suffix_keys and bounded by max_bytes """
+
+    def __init__(self, max_bytes=256*2**20):
+        self.max_bytes = max_bytes
+        self._columns = OrderedDict()
+        self._references = Counter()
+        self._dataset = None
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def bind(self, *arrays, variant=''):
+        fingerprint = dataset_fingerprint(*arrays) + variant.encode('utf-8')
+        if fingerprint != self._dataset:
+            self.clear()
+            self._dataset = fingerprint
+
+    def get(self, key):
+        column = self._columns.get(key)
+        if column is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._columns.move_to_end(key)
+        return column
+
+    def put(self, key, column):
+        if (key in self._columns) or (column.nbytes > self.max_bytes):
+            return
+        if isinstance(column, ndarray):
+            column.setflags(write=False)  # Cached columns are shared between individuals
+        self._columns[key] = column
+        # Genes such as PASS return their argument itself, so several entries may share one column. Its bytes are
+        # only counted once, while any entry holds it
+        self._references[id(column)] += 1
+        if self._references[id(column)] == 1:
+            self.nbytes += column.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._columns.popitem(last=False)
+            self._references[id(evicted)] -= 1
+            if not self._references[id(evicted)]:
+                del self._references[id(evicted)]
+                self.nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    def clear(self):
+        self._columns.clear()
+        self._references.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def cache_info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.evictions, len(self._columns), self.nbytes, self.max_bytes)
+
+    def __len__(self): return len(self._columns)
+    def __contains__(self, key): return key in self._columns
+
+
+# ======================================================================================================================
+# FITNESS
+
+
+def genotype_key(decoded_genotype) -> bytes:
+    return blake2b(decoded_genotype.encode('utf-8'), digest_size=16).digest()
+
+
+def genome_key(genome) -> bytes:
+    """ Key of a record of a packed population (see genome.py). Constants are 0.0 outside constant genes """
+    return blake2b(genome.tobytes(), digest_size=16).digest()
+
+
+class FitnessCache(object):
+    """ LRU cache of the fitness of whole individuals, keyed by genotype_key or genome_key and bounded by maxsize """
+
+    def __init__(self, maxsize=2**20):
+        self.maxsize = maxsize
+        self._fitness = OrderedDict()
+        self._dataset = None
+        self.hits = 0
+        self.misses = 0
+        self.duplicates = 0
+        self.evictions = 0
+
+    def bind(self, fitness_function_name, *arrays, variant=''):
+        fingerprint = dataset_fingerprint(*arrays) + '{};{}'.format(fitness_function_name, variant).encode('utf-8')
+        if fingerprint != self._dataset:
+            self.clear()
+            self._dataset = fingerprint
+
+    def fitness(self, keys, evaluate) -> ndarray:
+        """
+        Fitness of the individuals with the given keys. evaluate is called once, with the positions of the
+        individuals to evaluate (the first of each key missing from the cache), and returns their fitness.
+        """
+        fitness = empty(len(keys), dtype=float64)
+        missing = OrderedDict()
+        for position, key in enumerate(keys):
+            if key in missing:
+                missing[key].append(position)
+                self.duplicates += 1
+            elif key in self._fitness:
+                fitness[position] = self._fitness[key]
+                self._fitness.move_to_end(key)
+                self.hits += 1
+            else:
+                missing[key] = [position]
+                self.misses += 1
+
+        if missing:
+            evaluated = asarray(evaluate([positions[0] for positions in missing.values()]), dtype=float64)
+            for (key, positions), value in zip(missing.items(), evaluated.tolist()):
+                fitness[positions] = value
+                self._fitness[key] = value
+            while len(self._fitness) > self.maxsize:
+                self._fitness.popitem(last=False)
+                self.evictions += 1
+        return fitness
+
+    def clear(self):
+        self._fitness.clear()
+        self.hits = 0
+        self.misses = 0
+        self.duplicates = 0
+        self.evictions = 0
+
+    def cache_info(self) -> FitnessCacheInfo:
+        return FitnessCacheInfo(self.hits, self.misses, self.duplicates, self.evictions, len(self._fitness),
+                                self.maxsize)
+
+    def __len__(self): return len(self._fitness)
+    def __contains__(self, key): return key in self._fitness
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""checkpoint.py: Saving and resuming evolution runs, and saving datasets."""
+
+__license__     = "MIT"
+__author__      = "José Fonseca"
+__copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
+
+
+# ======================================================================================================================
+# IMPORTS
+
+
+import os
+import json
+import shutil
+from collections import namedtuple
+
+import numpy as np
+
+from symbolic_regression.engine import evolve_binary
+
+
+# ======================================================================================================================
+# PAYLOAD
+# A checkpoint directory holds the dataset once, in dataset/, and one directory per saved generation with the binary
+# population (see binary.py), its fitness and the state of the random generator. The LATEST file names the most
+# recent complete generation. Every file is written aside and atomically renamed into place, so readers never see a
+# partial generation, and load it as read-only memory maps.
+
+
+Checkpoint = namedtuple('Checkpoint', ['generation', 'words', 'fitness', 'input_array', 'output_array', 'state'])
+
+
+def _save_array(path, array):
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as file:
+        np.save(file, np.asarray(array))
+    os.replace(temporary_path, path)
+
+
+def _generation_directory(directory, generation):
+    return os.path.join(directory, 'generation_{:09d}'.format(generation))
+
+
+def save_dataset(directory, input_array, output_array):
+    dataset_directory = os.path.join(directory, 'dataset')
+    os.makedirs(dataset_directory, exist_ok=True)
+    _save_array(os.path.join(dataset_directory, 'inputs.npy'), np.asarray(input_array, dtype=np.float64))
+    _save_array(os.path.join(dataset_directory, 'outputs.npy'), np.asarray(output_array, dtype=np.float64))
+
+
+def save_checkpoint(directory, generation, words, fitness, rng=None, keep=2):
+    """ Save a generation of a binary population, and forget all but the last keep generations """
+    generation_directory = _generation_directory(directory, generation)
+    temporary_directory = generation_directory + '.tmp'
+    shutil.rmtree(temporary_directory, ignore_errors=True)
+    os.makedirs(temporary_directory)
+
+    np.save(os.path.join(temporary_directory, 'words.npy'), np.asarray(words, dtype=np.uint64))
+    np.save(os.path.join(temporary_directory, 'fitness.npy'), np.asarray(fitness, dtype=np.float64))
+    with open(os.path.join(temporary_directory, 'state.json'), 'w') as file:
+        json.dump({'generation': generation, 'rng': None if rng is None else rng.bit_generator.state}, file)
+
+    shutil.rmtree(generation_directory, ignore_errors=True)
+    os.replace(temporary_directory, generation_directory)
+    with open(os.path.join(directory, 'LATEST.tmp'), 'w') as file:
+        file.write(os.path.basename(generation_directory))
+    os.replace(os.path.join(directory, 'LATEST.tmp'), os.path.join(directory, 'LATEST'))
+
+    # Readers that already mapped a removed generation keep their view of it
+    saved_generations = sorted(name for name in os.listdir(directory)
+                               if name.startswith('generation_') and not name.endswith('.tmp'))
+    for name in saved_generations[:-keep]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def load_checkpoint(directory, mmap_mode='r'):
+    """ Load the latest generation and the dataset, as memory maps by default. Returns None if there is none """
+    if not os.path.exists(os.path.join(directory, 'LATEST')):
+        return None
+    with open(os.path.join(directory, 'LATEST'), 'r') as file:
+        generation_directory = os.path.join(directory, file.read().strip())
+    with open(os.path.join(generation_directory, 'state.json'), 'r') as file:
+        state = json.load(file)
+
+    return Checkpoint(
+        state['generation'],
+        np.load(os.path.join(generation_directory, 'words.npy'), mmap_mode=mmap_mode),
+        np.load(os.path.join(generation_directory, 'fitness.npy'), mmap_mode=mmap_mode),
+        np.load(os.path.join(directory, 'dataset', 'inputs.npy'), mmap_mode=mmap_mode),
+        np.load(os.path.join(directory, 'dataset', 'outputs.npy'), mmap_mode=mmap_mode),
+        state
+    )
+
+
+def restore_rng(state):
+    rng = np.random.default_rng()
+    rng.bit_generator.state = state
+    return rng
+
+
+def evolve_binary_with_checkpoints(directory, input_array, output_array, generations, every=1, keep=2, seed=None,
+                                   **configuration):
+    """ Same as engine.evolve_binary, saving checkpoints and resuming exactly from the latest one in the directory """
+    checkpoint = load_checkpoint(directory)
+    words = configuration.pop('words', None)  # The starting population, unless resuming
+    if checkpoint is None:
+        os.makedirs(directory, exist_ok=True)
+        save_dataset(directory, input_array, output_array)
+        first_generation, rng = 0, np.random.default_rng(seed)
+    else:
+        first_generation, words = checkpoint.generation, np.array(checkpoint.words)
+        rng = restore_rng(checkpoint.state['rng'])
+        input_array, output_array = checkpoint.input_array, checkpoint.output_array
+
+    for generation, words, fitness in evolve_binary(input_array, output_array, generations - first_generation,
+                                                    words=words, seed=rng, **configuration):
+        generation += first_generation
+        if (checkpoint is not None) and (generation == checkpoint.generation):
+            continue  # Already saved and yielded before the restart
+        if (generation % every == 0) or (generation == generations - 1):
+            save_checkpoint(directory, generation, words, fitness, rng, keep)
+        yield generation, words, fitness
@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""distributed.py: Fitness evaluation by remote workers, sent batches by a coordinator."""
+
+__license__     = "MIT"
+__author__      = "José Fonseca"
+__copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
+
+
+# ======================================================================================================================
+# IMPORTS
+
+
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import deque
+
+import numpy as np
+
+from symbolic_regression.genotype import compile_decoded_genotype, compile_packed_genotype, input_columns
+from symbolic_regression.population import fitness_compiled_population, kernels_name, KERNELS_NAMES
+from symbolic_regression.checkpoint import save_dataset
+
+
+# ======================================================================================================================
+# PROTOCOL
+# Every message is a JSON object, prefixed by its length as a 4-byte big-endian unsigned integer. Workers say hello,
+# then receive batches of genotypes and answer with their fitness, sending heartbeats all along:
+#   worker -> coordinator  {"type": "hello", "worker": name}
+#   coordinator -> worker  {"type": "batch", "id": id, "genotypes": [...], "packed": bool, "fitness_function": name,
+#                           "kernels": name of population.KERNELS_NAMES}
+#   worker -> coordinator  {"type": "result", "id": id, "fitness": [...], "seconds": seconds}
+#   worker -> coordinator  {"type": "heartbeat"}
+#   coordinator -> worker  {"type": "stop"}
+# Genotypes are decoded strings, or [opcodes, constants] pairs of a packed population (see genome.py). JSON writes
+# floats with repr, so constants arrive exactly. Addresses are tcp://host:port or unix:///path/to/socket.
+
+
+_LENGTH = struct.Struct('>I')
+
+
+async def send_message(writer, message):
+    payload = json.dumps(message).encode('utf-8')
+    writer.write(_LENGTH.pack(len(payload)) + payload)
+    await writer.drain()
+
+
+async def receive_message(reader) -> dict:
+    """ Returns the next message, or None once the connection is closed """
+    try:
+        length, = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+        return json.loads((await reader.readexactly(length)).decode('utf-8'))
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+
+
+def parse_address(address) -> tuple:
+    """ Returns ('tcp', host, port) or ('unix', path, None) """
+    scheme, _, location = address.partition('://')
+    if scheme == 'unix':
+        return 'unix', location, None
+    elif scheme == 'tcp':
+        host, _, port = location.rpartition(':')
+        return 'tcp', host, int(port)
+    else:
+        raise TypeError('UNKNOWN ADDRESS: {}'.format(address))
+
+
+async def _connect(address):
+    scheme, location, port = parse_address(address)
+    if scheme == 'unix':
+        return await asyncio.open_unix_connection(location)
+    return await asyncio.open_connection(location, port)
+
+
+# ======================================================================================================================
+# WORKER
+
+
+async def run_worker(address, dataset_directory, name=None, heartbeat_interval=1.0):
+    """
+    Load the dataset ONCE (as written by checkpoint.save_dataset), connect to the coordinator and evaluate the
+    batches it sends until it says stop or goes away. Evaluation runs in a thread, so heartbeats keep flowing.
+    """
+    columns = input_columns(np.load(os.path.join(dataset_directory, 'dataset', 'inputs.npy')))
+    output_array = np.load(os.path.join(dataset_directory, 'dataset', 'outputs.npy'))
+
+    def evaluate(batch):
+        start = time.perf_counter()
+        if batch['packed']:
+            programs = [compile_packed_genotype(np.asarray(opcodes, dtype=np.int16), np.asarray(constants))
+                        for opcodes, constants in batch['genotypes']]
+        else:
+            programs = [compile_decoded_genotype(genotype) for genotype in batch['genotypes']]
+        with np.errstate(all='ignore'):
+            fitness = fitness_compiled_population(programs, columns, output_array, batch['fitness_function'],
+                                                  kernels=KERNELS_NAMES[batch['kernels']])
+        return {'type': 'result', 'id': batch['id'], 'fitness': fitness.tolist(),
+                'seconds': time.perf_counter() - start}
+
+    reader, writer = await _connect(address)
+    lock = asyncio.Lock()
+
+    async def send(message):
+        async with lock:
+            await send_message(writer, message)
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(heartbeat_interval)
+            await send({'type': 'heartbeat'})
+
+    await send({'type': 'hello', 'worker': name or '{}:{}'.format(socket.gethostname(), os.getpid())})
+    heartbeats = asyncio.ensure_future(heartbeat())
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            message = await receive_message(reader)
+            if (message is None) or (message['type'] == 'stop'):
+                break
+            elif message['type'] == 'batch':
+                await send(await loop.run_in_executor(None, evaluate, message))
+    except ConnectionError:
+        pass
+    finally:
+        heartbeats.cancel()
+        writer.close()
+
+
+# ======================================================================================================================
+# COORDINATOR
+# The genotypes of an evaluation are split into batches on demand, sized for each worker so that a batch takes about
+# target_seconds: the size of the next batch of a worker grows or shrinks with the time its last batch took. Each
+# worker has up to two batches in flight, so it never waits for the next one. The batches of a worker that
+# disconnects, or sends nothing for heartbeat_timeout seconds, are sent to the other workers again. An evaluation left
+# without any worker for worker_timeout seconds raises a TimeoutError instead of waiting forever.
+
+
+class _Worker(object):
+
+    def __init__(self, name, writer, batch_size):
+        self.name = name
+        self.writer = writer
+        self.batch_size = batch_size
+        self.in_flight = {}
+        self.last_seen = time.monotonic()
+
+
+class Coordinator(object):
+
+    def __init__(self, address='tcp://127.0.0.1:0', heartbeat_timeout=10.0, target_seconds=0.5, batch_size=16,
+                 max_batch_size=4096, worker_timeout=60.0):
+        self.address = address
+        self.heartbeat_timeout = heartbeat_timeout
+        self.worker_timeout = worker_timeout
+        self.target_seconds = target_seconds
+        self.batch_size = batch_size
+        self.max_batch_size = max_batch_size
+        self.workers = set()
+        self.resubmitted = 0
+        self._server = None
+        self._monitor = None
+        self._pending = deque()
+        self._request = None
+        self._next_id = 0
+        self._evaluation_lock = None
+        self._worker_joined = None
+
+    async def start(self):
+        """ Start listening. With port 0, the address is updated with the port chosen by the system """
+        self._evaluation_lock = asyncio.Lock()
+        self._worker_joined = asyncio.Event()
+        scheme, location, port = parse_address(self.address)
+        if scheme == 'unix':
+            self._server = await asyncio.start_unix_server(self._serve, location)
+        else:
+            self._server = await asyncio.start_server(self._serve, location, port)
+            self.address = 'tcp://{}:{}'.format(location, self._server.sockets[0].getsockname()[1])
+        self._monitor = asyncio.ensure_future(self._monitor_heartbeats())
+        return self
+
+    async def wait_for_workers(self, count, timeout=60.0):
+        deadline = time.monotonic() + timeout
+        while len(self.workers) < count:
+            self._worker_joined.clear()
+            await asyncio.wait_for(self._worker_joined.wait(), max(0.0, deadline - time.monotonic()))
+
+    async def evaluate(self, genotypes, fitness_function_name, packed=False, kernels=None) -> np.ndarray:
+        """ Fitness of the genotypes (decoded, or a packed population, see genome.py), computed by the workers """
+        async with self._evaluation_lock:
+            if packed:
+                genotypes = [[genome['opcodes'].tolist(), genome['constants'].tolist()] for genome in genotypes]
+            genotypes = list(genotypes)
+            self._request = {'genotypes': genotypes, 'packed': packed, 'fitness_function': fitness_function_name,
+                             'kernels': kernels_name(kernels),
+                             'fitness': np.full(len(genotypes), np.nan), 'remaining': len(genotypes),
+                             'done': asyncio.get_running_loop().create_future()}
+            if genotypes:
+                self._pending.append((0, len(genotypes)))
+                self._dispatch_all()
+                while not self._request['done'].done():
+                    if not self.workers:
+                        await self._wait_for_worker()
+                    await asyncio.wait({self._request['done']}, timeout=min(1.0, self.worker_timeout))
+            fitness, self._request = self._request['fitness'], None
+            return fitness
+
+    async def _wait_for_worker(self):
+        self._worker_joined.clear()
+        try:
+            await asyncio.wait_for(self._worker_joined.wait(), self.worker_timeout)
+        except asyncio.TimeoutError:
+            self._pending.clear()
+            self._request = None
+            raise TimeoutError('NO WORKER FOR {} SECONDS'.format(self.worker_timeout))
+
+    async def close(self):
+        for worker in list(self.workers):
+            try:
+                await send_message(worker.writer, {'type': 'stop'})
+            except ConnectionError:
+                pass
+            worker.writer.close()
+        if self._monitor is not None:
+            self._monitor.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        scheme, location, _ = parse_address(self.address)
+        if (scheme == 'unix') and os.path.exists(location):
+            os.remove(location)
+
+    # Workers ----------------------------------------------------------------------------------------------------------
+
+    async def _serve(self, reader, writer):
+        hello = await receive_message(reader)
+        if (hello is None) or (hello.get('type') != 'hello'):
+            writer.close()
+            return
+        worker = _Worker(hello.get('worker'), writer, self.batch_size)
+        self.workers.add(worker)
+        self._worker_joined.set()
+        self._dispatch(worker)
+
+        while worker in self.workers:
+            message = await receive_message(reader)
+            if message is None:
+                break
+            worker.last_seen = time.monotonic()
+            if message['type'] == 'result':
+                self._receive_result(worker, message)
+                self._dispatch(worker)
+        self._lose(worker)
+
+    def _lose(self, worker):
+        """ Forget a worker and send its batches again """
+        if worker in self.workers:
+            self.workers.discard(worker)
+            worker.writer.close()
+        for start, end in worker.in_flight.values():
+            self._pending.appendleft((start, end))
+            self.resubmitted += 1
+        worker.in_flight.clear()
+        self._dispatch_all()
+
+    async def _monitor_heartbeats(self):
+        while True:
+            await asyncio.sleep(min(1.0, self.heartbeat_timeout / 2))
+            for worker in list(self.workers):
+                if time.monotonic() - worker.last_seen > self.heartbeat_timeout:
+                    self._lose(worker)
+
+    # Batches ----------------------------------------------------------------------------------------------------------
+
+    def _dispatch_all(self):
+        for worker in list(self.workers):
+            self._dispatch(worker)
+
+    def _dispatch(self, worker):
+        while (self._request is not None) and self._pending and (len(worker.in_flight) < 2):
+            start, end = self._pending.popleft()
+            if end - start > worker.batch_size:
+                self._pending.appendleft((start + worker.batch_size, end))
+                end = start + worker.batch_size
+            batch_id, self._next_id = self._next_id, self._next_id + 1
+            worker.in_flight[batch_id] = (start, end)
+            asyncio.ensure_future(self._send_batch(worker, {
+                'type': 'batch', 'id': batch_id, 'genotypes': self._request['genotypes'][start:end],
+                'packed': self._request['packed'], 'fitness_function': self._request['fitness_function'],
+                'kernels': self._request['kernels']
+            }))
+
+    async def _send_batch(self, worker, batch):
+        try:
+            await send_message(worker.writer, batch)
+        except ConnectionError:
+            self._lose(worker)
+
+    def _receive_result(self, worker, message):
+        if message['id'] not in worker.in_flight:
+            return  # A batch already given up on and sent again
+        start, end = worker.in_flight.pop(message['id'])
+        self._request['fitness'][start:end] = message['fitness']
+        self._request['remaining'] -= end - start
+
+        # Size the next batches of the worker to take about target_seconds
+        scale = self.target_seconds / max(message['seconds'], 1e-3)
+        worker.batch_size = int(min(self.max_batch_size, max(1, (end - start) * min(2.0, max(0.5, scale)))))
+
+        if self._request['remaining'] == 0:
+            self._request['done'].set_result(None)
+
+
+# ======================================================================================================================
+# LOCAL STAND-IN
+
+
+def spawn_local_workers(address, dataset_directory, count):
+    """ Start workers as subprocesses of this machine. Returns the Popen objects """
+    environment = dict(os.environ)
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment['PYTHONPATH'] = os.pathsep.join(filter(None, [package_parent, environment.get('PYTHONPATH')]))
+    return [subprocess.Popen([sys.executable, '-m', 'symbolic_regression.distributed', 'worker', address,
+                              dataset_directory, '--name', 'local-{}'.format(worker)], env=environment)
+            for worker in range(count)]
+
+
+class DistributedFitness(object):
+    """ Synchronous front of a Coordinator, for engine.evolve(fitness=...). local_workers start workers here """
+
+    def __init__(self, fitness_function_name, address='tcp://127.0.0.1:0', input_array=None, output_array=None,
+                 local_workers=0, packed=False, kernels=None, **coordinator_configuration):
+        self.fitness_function_name = fitness_function_name
+        self.packed = packed
+        self.kernels = kernels
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self.coordinator = self._run(Coordinator(address, **coordinator_configuration).start())
+
+        self._directory, self._processes = None, []
+        if local_workers > 0:
+            self._directory = tempfile.TemporaryDirectory()
+            save_dataset(self._directory.name, input_array, output_array)
+            self._processes = spawn_local_workers(self.coordinator.address, self._directory.name, local_workers)
+            self._run(self.coordinator.wait_for_workers(local_workers))
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def fitness(self, population):
+        return self._run(self.coordinator.evaluate(population, self.fitness_function_name, self.packed, self.kernels))
+
+    def close(self):
+        self._run(self.coordinator.close())
+        for process in self._processes:
+            process.wait()
+        if self._directory is not None:
+            self._directory.cleanup()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def __enter__(self): return self
+    def __exit__(self, *args): self.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Distributed fitness worker')
+    parser.add_argument('role', choices=['worker'])
+    parser.add_argument('address', help='tcp://host:port or unix:///path')
+    parser.add_argument('dataset', help='directory written by checkpoint.save_dataset')
+    parser.add_argument('--name', default=None)
+    parser.add_argument('--heartbeat-interval', type=float, default=1.0)
+    arguments = parser.parse_args()
+    asyncio.run(run_worker(arguments.address, arguments.dataset, arguments.name, arguments.heartbeat_interval))
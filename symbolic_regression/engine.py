@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""engine.py: The evolution loop over decoded or binary populations."""
+
+__license__     = "MIT"
+__author__      = "José Fonseca"
+__copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
+
+
+# ======================================================================================================================
+# IMPORTS
+
+
+import numpy as np
+
+from symbolic_regression.population import initialize_population, fitness_decoded_population, \
+    fitness_packed_population, apply_selection, apply_crossover, mutate_decoded_population, elite_positions
+from symbolic_regression.binary import genomes_to_words, words_to_genomes, apply_binary_crossover, bitflip_mutation
+from symbolic_regression.instrumentation import phase
+from symbolic_regression.incremental import IncrementalFitness
+from symbolic_regression.optimization import optimize_population
+from symbolic_regression.simplify import simplify_decoded_genotype, simplify_packed_population
+
+
+# ======================================================================================================================
+# PAYLOAD
+
+
+def function_name(name) -> str:
+    return str(name).upper().strip().replace(' ', '_')
+
+
+def epoch(decoded_population, fitness, rng, input_size=1, selection_function='TOURNAMENT', selection_group_size=3,
+          selection_population_size=None, elitism_size=1, crossover_function='RANDOM_REPRODUCTION',
+          mutation_probability=0.5, constant_mutation_factor_max=1.0, instrumentation=None, return_parents=False):
+    """ One generation: selection, crossover, mutation and elitism. With return_parents, also the parent of each """
+    population_size = len(decoded_population)
+    elitism_size = min(elitism_size, population_size)
+
+    # Select the crossing population as an array of POSITIONS of individuals
+    with phase(instrumentation, 'selection'):
+        selected_positions = apply_selection(
+            fitness, function_name(selection_function), selection_population_size or population_size,
+            selection_group_size, rng
+        )
+
+    # Cross and mutate the selected population until we have a whole new population, apart from the elite
+    with phase(instrumentation, 'crossover'):
+        new_population, parents = apply_crossover(
+            decoded_population, selected_positions, population_size - elitism_size, function_name(crossover_function),
+            rng, return_parents=True
+        )
+    with phase(instrumentation, 'mutation'):
+        new_population = mutate_decoded_population(
+            new_population, mutation_probability, rng, input_size, constant_mutation_factor_max
+        )
+
+    # Apply elitism to the new population
+    elite = elite_positions(fitness, elitism_size)
+    new_population = new_population + [decoded_population[position] for position in elite]
+    return (new_population, np.concatenate([parents, elite])) if return_parents else new_population
+
+
+def epoch_binary(words, fitness, rng, input_size=1, selection_function='TOURNAMENT', selection_group_size=3,
+                 selection_population_size=None, elitism_size=1, crossover_function='SINGLE_POINT',
+                 bit_mutation_probability=0.001, instrumentation=None):
+    """ Same as epoch, for a binary population (see binary.py) with bitwise crossover and mutation """
+    population_size = len(words)
+    elitism_size = min(elitism_size, population_size)
+
+    with phase(instrumentation, 'selection'):
+        selected_positions = apply_selection(
+            fitness, function_name(selection_function), selection_population_size or population_size,
+            selection_group_size, rng
+        )
+    with phase(instrumentation, 'crossover'):
+        new_words = apply_binary_crossover(
+            words, selected_positions, population_size - elitism_size, function_name(crossover_function), rng
+        )
+    with phase(instrumentation, 'mutation'):
+        new_words = bitflip_mutation(new_words, bit_mutation_probability, rng, input_size)
+    return np.concatenate([new_words, words[elite_positions(fitness, elitism_size)]])
+
+
+def _evolve(population, fitness, epoch_function, generations, rng, input_size, epoch_configuration,
+            instrumentation=None, lineage=False, local_search=None):
+    """
+    With lineage, the fitness is also given the position of the parent of each individual (None at first).
+    The local search, if any, takes the population and its fitness, and returns them improved.
+    """
+    population_fitness, parents = None, None
+    for generation in range(generations):
+
+        # A generation is the epoch that creates the population, if any, and its fitness
+        with phase(instrumentation, 'generation'):
+            if generation > 0:
+                population = epoch_function(population, population_fitness, rng, input_size,
+                                            instrumentation=instrumentation, **epoch_configuration,
+                                            **({'return_parents': True} if lineage else {}))
+                if lineage:
+                    population, parents = population
+            with phase(instrumentation, 'fitness'):
+                population_fitness = fitness(population, parents) if lineage else fitness(population)
+            if local_search is not None:
+                with phase(instrumentation, 'optimization'):
+                    population, population_fitness = local_search(population, population_fitness)
+
+        if instrumentation is not None:
+            valid_fitness = population_fitness[np.isfinite(population_fitness)]
+            instrumentation.end_generation(
+                generation, population_size=len(population), invalid=len(population) - len(valid_fitness),
+                best_fitness=float(valid_fitness.min()) if len(valid_fitness) else None
+            )
+        yield generation, population, population_fitness
+
+
+def _watch_cache(instrumentation, cache, fitness_cache):
+    if instrumentation is not None:
+        for name, watched_cache in (('subtree_cache', cache), ('fitness_cache', fitness_cache)):
+            if watched_cache is not None:
+                instrumentation.watch_cache(name, watched_cache)
+
+
+def _setup(input_array, output_array, seed):
+    return np.random.default_rng(seed), np.asarray(input_array).reshape(len(output_array), -1).shape[1]
+
+
+def evolve(input_array, output_array, generations, population_size=100, individual_size=10,
+           fitness_function='RMSE', decoded_population=None, seed=None, fitness=None, batch_size=None, cache=None,
+           instrumentation=None, simplify=False, fitness_cache=None, incremental=False, optimization_size=0,
+           optimization_scaling=True, optimization_iterations=10, kernels=None, **epoch_configuration):
+    """ Evolve a population of decoded genotypes, yielding (generation, population, fitness) for each generation """
+    # The seed, or a NumPy generator used as is, drives every random draw of the run. The random module is left alone
+    rng, input_size = _setup(input_array, output_array, seed)
+    fitness_function = function_name(fitness_function)
+
+    if decoded_population is None:
+        decoded_population = initialize_population(population_size, individual_size, input_size, rng)
+
+    # Incremental fitness evaluates each child from its parent, so it replaces the whole default fitness
+    if incremental:
+        ignored = [name for name, value in (('fitness', fitness), ('simplify', simplify or None), ('cache', cache),
+                                            ('fitness_cache', fitness_cache), ('batch_size', batch_size))
+                   if value is not None]
+        if ignored:
+            raise ValueError('INCREMENTAL FITNESS CANNOT BE COMBINED WITH: {}'.format(', '.join(ignored)))
+        fitness = IncrementalFitness(input_array, output_array, fitness_function, kernels=kernels)
+    elif fitness is None:
+        def fitness(population):
+            # Only the evaluated genotypes are simplified, the population itself is left as it is
+            if simplify:
+                population = [simplify_decoded_genotype(decoded_genotype, kernels)
+                              for decoded_genotype in population]
+            return fitness_decoded_population(population, input_array, output_array, fitness_function,
+                                              batch_size=batch_size, cache=cache, fitness_cache=fitness_cache,
+                                              kernels=kernels)
+
+    def local_search(population, population_fitness):
+        return optimize_population(population, population_fitness, input_array, output_array, fitness_function,
+                                   optimization_size, optimization_scaling, optimization_iterations, kernels)
+
+    _watch_cache(instrumentation, cache, fitness_cache)
+    return _evolve(decoded_population, fitness, epoch, generations, rng, input_size, epoch_configuration,
+                   instrumentation, lineage=isinstance(fitness, IncrementalFitness),
+                   local_search=local_search if optimization_size > 0 else None)
+
+
+def evolve_binary(input_array, output_array, generations, population_size=100, individual_size=10,
+                  fitness_function='RMSE', words=None, seed=None, fitness=None, batch_size=None, cache=None,
+                  instrumentation=None, simplify=False, fitness_cache=None, kernels=None, **epoch_configuration):
+    """ Same as evolve, for a binary population (see binary.py). Fitness is computed on the packed genomes """
+    rng, input_size = _setup(input_array, output_array, seed)
+    fitness_function = function_name(fitness_function)
+
+    if words is None:
+        words = genomes_to_words(
+            initialize_population(population_size, individual_size, input_size, rng, packed=True), input_size
+        )
+    if fitness is None:
+        def fitness(population):
+            genomes = words_to_genomes(population, input_size)
+            if simplify:
+                genomes = simplify_packed_population(genomes, kernels)
+            return fitness_packed_population(genomes, input_array, output_array, fitness_function,
+                                             batch_size=batch_size, cache=cache, fitness_cache=fitness_cache,
+                                             kernels=kernels)
+
+    _watch_cache(instrumentation, cache, fitness_cache)
+    return _evolve(words, fitness, epoch_binary, generations, rng, input_size, epoch_configuration, instrumentation)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""genome.py: Packed genotypes, as opcode and constant arrays."""
+
+__license__     = "MIT"
+__author__      = "José Fonseca"
+__copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
+
+
+# ======================================================================================================================
+# IMPORTS
+
+
+import numpy as np
+
+from symbolic_regression import operators
+
+
+# ======================================================================================================================
+# PACKED GENOTYPES
+# A packed genotype is a pair of arrays: one int16 opcode per gene (see operators.OPCODES) and one float64 constant
+# per gene, which is only meaningful where the opcode is operators.OPCODE_CONSTANT.
+
+
+def pack_decoded_genotype(decoded_genotype) -> tuple:
+    opcodes, constants = zip(*[operators.gene_to_opcode(gene) for gene in decoded_genotype.split(';')])
+    return np.asarray(opcodes, dtype=np.int16), np.asarray(constants, dtype=np.float64)
+
+
+def opcode_to_gene(opcode:int, constant:float) -> str:
+    if opcode == operators.OPCODE_CONSTANT:
+        return '<{}>'.format(constant)
+    elif opcode >= operators.OPCODE_INPUT:
+        return 'INPUT_{}'.format(opcode - operators.OPCODE_INPUT)
+    else:
+        return operators.OPERATORS[opcode]
+
+
+def unpack_genotype(opcodes, constants) -> str:
+    return ';'.join([
+        opcode_to_gene(opcode, constant) for opcode, constant in zip(opcodes.tolist(), constants.tolist())
+    ])
+
+
+def encode_packed_genotype(opcodes, constants) -> str:
+    """ Same as operators.encode_genotype(unpack_genotype(opcodes, constants)), without the string round-trip """
+    return ''.join([
+        operators.encode_value(constant if opcode == operators.OPCODE_CONSTANT else opcode)
+        for opcode, constant in zip(opcodes.tolist(), constants.tolist())
+    ])
+
+
+def decode_packed_genotype(encoded_genotype) -> tuple:
+    """ Same as pack_decoded_genotype(operators.decode_genotype(encoded_genotype)) """
+    opcodes, constants = zip(*[
+        operators.gene_to_opcode(operators.DECODING_OPERATORS[gene]) if gene in operators.DECODING_OPERATORS
+        else (operators.OPCODE_CONSTANT, operators.decode_value(gene))
+        for gene in [encoded_genotype[64*i:64*(i+1)] for i in range(len(encoded_genotype) // 64)]
+    ])
+    return np.asarray(opcodes, dtype=np.int16), np.asarray(constants, dtype=np.float64)
+
+
+# ======================================================================================================================
+# PACKED POPULATIONS
+# A packed population is a structured array with one record per individual, holding its opcodes and constants.
+
+
+def genome_dtype(individual_size:int) -> np.dtype:
+    return np.dtype([('opcodes', np.int16, (individual_size,)), ('constants', np.float64, (individual_size,))])
+
+
+def stack_packed_genotypes(packed_genotypes) -> np.ndarray:
+    individual_sizes = {len(opcodes) for opcodes, _ in packed_genotypes}
+    if len(individual_sizes) > 1:
+        raise ValueError('PACKED POPULATIONS REQUIRE INDIVIDUALS OF THE SAME SIZE, GOT {}'.format(individual_sizes))
+
+    genomes = np.zeros(len(packed_genotypes), dtype=genome_dtype(individual_sizes.pop() if individual_sizes else 0))
+    for genome, (opcodes, constants) in zip(genomes, packed_genotypes):
+        genome['opcodes'] = opcodes
+        genome['constants'] = constants
+    return genomes
+
+
+def pack_decoded_population(decoded_population) -> np.ndarray:
+    return stack_packed_genotypes([pack_decoded_genotype(decoded_genotype) for decoded_genotype in decoded_population])
+
+
+def unpack_population(genomes) -> list:
+    """ Same as unpack_genotype for each genome. Gene names are looked up for the whole population at once """
+    opcodes = genomes['opcodes']
+    input_size = int(opcodes.max(initial=operators.OPCODE_INPUT-1)) - operators.OPCODE_INPUT + 1
+    names = np.asarray(operators.OPERATORS + ['INPUT_{}'.format(i) for i in range(input_size)] + [None], dtype=object)
+
+    genes = names[opcodes]  # OPCODE_CONSTANT (-1) reads the last name, and is replaced below
+    is_constant = opcodes == operators.OPCODE_CONSTANT
+    genes[is_constant] = ['<{}>'.format(constant) for constant in genomes['constants'][is_constant].tolist()]
+    return [';'.join(genotype) for genotype in genes.tolist()]
+
+
+def encode_packed_population(genomes) -> list:
+    return [encode_packed_genotype(genome['opcodes'], genome['constants']) for genome in genomes]
+
+
+def decode_packed_population(encoded_population) -> np.ndarray:
+    return stack_packed_genotypes([decode_packed_genotype(encoded_genotype) for encoded_genotype in encoded_population])
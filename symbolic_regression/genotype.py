@@ -13,10 +13,15 @@ __copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
 
 
 import random
+from bisect import bisect
+from hashlib import blake2b
 from functools import lru_cache
+from contextlib import nullcontext
 
+import numpy as np
 from numpy import cos, pi
 from symbolic_regression import operators, MAX_VALUE, PRECISION
+from symbolic_regression.genome import pack_decoded_genotype, genome_dtype
 
 
 # ======================================================================================================================
@@ -36,19 +41,57 @@ def random_gene(family, input_size):
     if family == 'INPUT':
         return 'INPUT_{};'.format(random.randint(0, input_size-1))
     elif family == 'CONSTANT':
-        return '<{}>;'.format(round(cos(random.random() * pi * 2.0) * MAX_VALUE/1e6, PRECISION))
+        return '<{}>;'.format(random_constant())
     else:
         return f"{family};"
 
 
+def _random_integer(size, rng=None):
+    """ Uniform integer in [0, size), from the NumPy generator if given and from the random module otherwise """
+    return random.randint(0, size-1) if rng is None else int(rng.integers(size))
+
+
+def random_constant(rng=None):
+    return round(cos((random if rng is None else rng).random() * pi * 2.0) * MAX_VALUE/1e6, PRECISION)
+
+
+def random_grammar_gene(individual_size, position, input_size, rng=None):
+    """ Draw a gene for the position with the chances of the compiled grammar (see operators.compile_grammar) """
+    cumulative_weights = operators.grammar_cumulative(individual_size)[position]
+    # The same draw as random.choices(cum_weights=), so the random module gives the same genes as before
+    opcode = int(operators.GRAMMAR_OPCODES[bisect(
+        cumulative_weights, (random if rng is None else rng).random() * cumulative_weights[-1], 0,
+        len(cumulative_weights) - 1
+    )])
+    if opcode == operators.OPCODE_INPUT:
+        return 'INPUT_{}'.format(_random_integer(input_size, rng))
+    elif opcode == operators.OPCODE_CONSTANT:
+        return '<{}>'.format(random_constant(rng))
+    else:
+        return operators.OPERATORS[opcode]
+
+
 def generate_decoded_genotype(individual_size, input_size=1):
+    return ';'.join([
+        random_grammar_gene(individual_size, position, input_size)
+        for position in range(len(operators.grammar_cumulative(individual_size)))
+    ])
+
 
-    genotype = ''
-    for level in operators.GRAMMAR(individual_size).split(';'):
-        family = random.choice(level.split('|'))
-        genotype += random_gene(family, input_size)
+def generate_packed_population(population_size, individual_size, input_size, rng) -> np.ndarray:
+    """
+    Draw a whole packed population (see genome.py) with a NumPy generator, in a handful of vectorized calls.
+    The genes follow the same chances as generate_decoded_genotype.
+    """
+    opcodes = operators.sample_grammar_opcodes(population_size, individual_size, input_size, rng)
+    is_constant = opcodes == operators.OPCODE_CONSTANT
 
-    return genotype[:-1]
+    genomes = np.zeros(population_size, dtype=genome_dtype(opcodes.shape[1]))
+    genomes['opcodes'] = opcodes
+    genomes['constants'][is_constant] = np.round(
+        np.cos(rng.random(np.count_nonzero(is_constant)) * pi * 2.0) * MAX_VALUE/1e6, PRECISION
+    )
+    return genomes
 
 
 @lru_cache(1024)
@@ -79,30 +122,165 @@ def evaluate_decoded_genotype(decoded_genotype, *args):
         raise TypeError('UNKNOWN GENE {}'.format(gene))
 
 
-def mutate_decoded_genotype(decoded_genotype, input_size=1, constant_mutation_factor_max=1.0):
+def compile_packed_genotype(opcodes, constants):
+    """ Turn a packed genotype (see genome.py) into a flat opcode program (opcodes, constants, order) """
+    # Gene i reads genes i+1 and i+2, so running the reachable positions from the last to the first computes every
+    # gene exactly once
+    opcode_list = opcodes.tolist()
+
+    # Find the positions reachable from the root
+    reachable = set()
+    pending = [0]
+    while pending:
+        position = pending.pop()
+        if position in reachable:
+            continue
+        if position >= len(opcode_list):
+            raise TypeError('MISSING ARGUMENT AT POSITION {}'.format(position))
+        reachable.add(position)
+        pending.extend(range(position+1, position+1+operators.opcode_arity(opcode_list[position])))
+
+    return opcodes, constants, np.asarray(sorted(reachable, reverse=True), dtype=np.intp)
+
+
+def compile_decoded_genotype(decoded_genotype):
+    """ Parse a decoded genotype ONCE into a flat opcode program. See compile_packed_genotype """
+    return compile_packed_genotype(*pack_decoded_genotype(decoded_genotype))
+
+
+def input_columns(input_array):
+    """ Returns the inputs as a contiguous (inputs x rows) float64 matrix. 1D arrays are a single input """
+    input_array = np.asarray(input_array, dtype=np.float64)
+    return np.ascontiguousarray(input_array.reshape(input_array.shape[0], -1).T)
+
+
+def suffix_keys(program) -> list:
+    """ Digest of the subexpression that starts at each position. Equal subexpressions evaluate to equal columns """
+    # Only the genes a position reaches are hashed, through the digests of its arguments, so unreachable tail genes
+    # never change the key
+    opcodes, constants, _ = program
+    keys = [b''] * len(opcodes)
+    for position in range(len(opcodes)-1, -1, -1):
+        opcode = int(opcodes[position])
+        payload = constants[position].tobytes() if opcode == operators.OPCODE_CONSTANT else b''
+        keys[position] = blake2b(
+            opcodes[position].tobytes() + payload + b''.join(
+                keys[position+1:position+1+operators.opcode_arity(opcode)]
+            ), digest_size=16
+        ).digest()
+    return keys
+
+
+def execute_program(program, columns, out=None, cache=None, kernels=None):
+    """ Execute a compiled genotype over the (inputs x rows) columns, writing one output per row """
+    opcodes, constants, order = program
+    opcodes = opcodes.tolist()
+    values = [None] * len(opcodes)
+    out = np.empty(columns.shape[1:], dtype=np.float64) if out is None else out
+
+    if cache is not None:
+        keys = suffix_keys(program)
+        needed = set()
+        pending = [0]
+        while pending:
+            position = pending.pop()
+            if (position in needed) or (values[position] is not None):
+                continue
+            opcode = opcodes[position]
+            if 0 <= opcode < operators.OPCODE_INPUT:
+                values[position] = cache.get(keys[position])
+                if values[position] is not None:
+                    continue
+            needed.add(position)
+            pending.extend(range(position+1, position+1+operators.opcode_arity(opcode)))
+        order = sorted(needed, reverse=True)
+    else:
+        order = order.tolist()
+
+    functions = operators.OPERATOR_FUNCTIONS if kernels is None else kernels
+    with np.errstate(all='ignore') if kernels is not None else nullcontext():
+        for position in order:
+            opcode = opcodes[position]
+            if opcode == operators.OPCODE_CONSTANT:
+                values[position] = constants[position]
+            elif opcode >= operators.OPCODE_INPUT:
+                values[position] = columns[opcode - operators.OPCODE_INPUT]
+            else:
+                values[position] = functions[opcode](*values[position+1:position+1+operators.OPERATOR_ARITY[opcode]])
+
+            if (cache is not None) and (0 <= opcode < operators.OPCODE_INPUT):
+                cache.put(keys[position], values[position])
+
+    # Constant-only programs produce a scalar, so broadcast it to one value per row
+    if values[0] is not out:
+        np.copyto(out, values[0])
+    return out
+
+
+def evaluate_compiled_genotype(program, input_array, cache=None):
+    """ Evaluate a compiled genotype over every row of the input array at once, returning one output per row """
+    columns = input_columns(input_array)
+    if cache is not None:
+        cache.bind(columns)
+    return execute_program(program, columns, cache=cache)
+
+
+def execute_program_values(program, columns, parent=None, kernels=None) -> list:
+    """ Same as execute_program, returning the value of every position. Positions equal to the parent's are reused """
+    opcodes, constants, order = program
+    opcode_list = opcodes.tolist()
+    values = [None] * len(opcode_list)
+
+    parent_values, dirty = None, None
+    if (parent is not None) and (len(parent[0][0]) == len(opcode_list)):
+        (parent_opcodes, parent_constants, _), parent_values = parent
+        dirty = ((opcodes != parent_opcodes) | (constants != parent_constants)).tolist()
+
+    functions = operators.OPERATOR_FUNCTIONS if kernels is None else kernels
+    with np.errstate(all='ignore') if kernels is not None else nullcontext():
+        for position in order.tolist():
+            opcode = opcode_list[position]
+            arity = operators.opcode_arity(opcode)
+            if dirty is not None:
+                dirty[position] = dirty[position] or any(dirty[position+1:position+1+arity])
+                if not dirty[position] and (parent_values[position] is not None):
+                    values[position] = parent_values[position]
+                    continue
+
+            if opcode == operators.OPCODE_CONSTANT:
+                values[position] = constants[position]
+            elif opcode >= operators.OPCODE_INPUT:
+                values[position] = columns[opcode - operators.OPCODE_INPUT]
+            else:
+                values[position] = functions[opcode](*values[position+1:position+1+arity])
+    return values
+
+
+def mutate_decoded_genotype(decoded_genotype, input_size=1, constant_mutation_factor_max=1.0, rng=None):
+    """ Draws from the NumPy generator if given, and from the random module otherwise """
 
     # Select the gene to mutate
     chromossome = decoded_genotype.split(';')
-    mutated_position = random.randint(0, len(chromossome)-1)
+    mutated_position = _random_integer(len(chromossome), rng)
     original_gene = chromossome[mutated_position]
 
     # If the original gene is an input and we only have one input, we select another gene to mutate
     while (input_size == 1) and (original_gene.startswith('INPUT_')):
-        mutated_position = random.randint(0, len(chromossome)-1)
+        mutated_position = _random_integer(len(chromossome), rng)
         original_gene = chromossome[mutated_position]
 
     # If the original gene is an input and we have more than one input, we mutate the input
     if (input_size > 1) and (original_gene.startswith('INPUT_')):
-        new_gene = f'INPUT_{random.randint(0, input_size-1)}'
+        new_gene = f'INPUT_{_random_integer(input_size, rng)}'
 
     # If the original gene is a constant, we mutate it by a limited factor
     elif original_gene.startswith('<'):
-        new_gene = '<{}>'.format(float(original_gene[1:-1]) * random.random() * constant_mutation_factor_max)
+        new_gene = '<{}>'.format(float(original_gene[1:-1]) * (random if rng is None else rng).random()
+                                 * constant_mutation_factor_max)
 
     else:
-        # Select a random family for the chromo from the available families for the position in the grammar
-        family = random.choice((operators.GRAMMAR(len(chromossome)).split(';')[mutated_position]).split('|'))
-        new_gene = random_gene(family, input_size)[:-1]
+        # Draw a new gene with the chances of the position in the compiled grammar
+        new_gene = random_grammar_gene(len(chromossome), mutated_position, input_size, rng)
 
     # Alter the gene and return
     chromossome[mutated_position] = new_gene
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""incremental.py: Fitness that re-evaluates each child from its parent."""
+
+__license__     = "MIT"
+__author__      = "José Fonseca"
+__copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
+
+
+# ======================================================================================================================
+# IMPORTS
+
+
+import numpy as np
+
+from symbolic_regression.genotype import compile_decoded_genotype, input_columns, execute_program_values
+from symbolic_regression.population import fitness_from_squared_error_sums, MSE_NAMES, RMSE_NAMES
+
+
+# ======================================================================================================================
+# PAYLOAD
+
+
+class IncrementalFitness(object):
+    """ Fitness that evaluates each child from the kept values of its parent (see genotype.execute_program_values) """
+
+    def __init__(self, input_array, output_array, fitness_function_name, max_bytes=256*2**20, kernels=None):
+        if fitness_function_name not in MSE_NAMES | RMSE_NAMES:
+            raise TypeError('UNKNOWN FITNESS FUNCTION: {}'.format(fitness_function_name))
+        self.columns = input_columns(input_array)
+        self.output_array = np.asarray(output_array, dtype=np.float64)
+        self.fitness_function_name = fitness_function_name
+        self.max_bytes = max_bytes
+        self.kernels = kernels
+        self._generation = []
+        self.reused = 0
+        self.computed = 0
+
+    def __call__(self, decoded_population, parents=None):
+        """ parents holds the position of the parent of each individual in the previous population, if any """
+        sums = np.empty(len(decoded_population), dtype=np.float64)
+        generation = []
+        nbytes = 0
+        squared_errors = np.empty(self.columns.shape[1], dtype=np.float64)
+        for individual, decoded_genotype in enumerate(decoded_population):
+            program = compile_decoded_genotype(decoded_genotype)
+            parent = None if parents is None else self._generation[parents[individual]]
+            values = execute_program_values(program, self.columns, parent, self.kernels)
+            self._count(values, parent)
+
+            np.subtract(values[0], self.output_array, out=squared_errors)
+            np.square(squared_errors, out=squared_errors)
+            sums[individual] = squared_errors.sum()
+
+            # Keep the values for the children, as long as they fit
+            values_nbytes = sum([np.asarray(value).nbytes for value in values if value is not None])
+            if nbytes + values_nbytes <= self.max_bytes:
+                generation.append((program, values))
+                nbytes += values_nbytes
+            else:
+                generation.append(None)
+
+        self._generation = generation
+        return fitness_from_squared_error_sums(sums, self.columns.shape[1], self.fitness_function_name)
+
+    def _count(self, values, parent):
+        evaluated = [position for position, value in enumerate(values) if value is not None]
+        reused = 0 if parent is None else sum([values[position] is parent[1][position] for position in evaluated])
+        self.reused += reused
+        self.computed += len(evaluated) - reused
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""instrumentation.py: Timing, counters and memory of each generation."""
+
+__license__     = "MIT"
+__author__      = "José Fonseca"
+__copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
+
+
+# ======================================================================================================================
+# IMPORTS
+
+
+import sys
+import csv
+import json
+from time import perf_counter
+from contextlib import contextmanager, nullcontext
+from collections import defaultdict
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+# ======================================================================================================================
+# PAYLOAD
+# An Instrumentation collects, for each generation, the wall time and number of calls of each phase of the evolution
+# loop, free-form counters, the state of the watched caches and the peak memory of the process. At the end of each
+# generation the record is kept in .records and handed to every registered callback, such as the sinks below.
+# The phases of the engine are always reported, at zero when they did not run, so every record has the same fields.
+
+
+PHASES = ('generation', 'fitness', 'selection', 'crossover', 'mutation')
+
+
+def peak_memory():
+    """ Peak resident memory of the process, in bytes. None where the platform does not report it """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+
+
+class Instrumentation(object):
+
+    def __init__(self, callbacks=(), phases=PHASES):
+        self.phases = tuple(phases)
+        self.callbacks = list(callbacks)
+        self.caches = {}
+        self.records = []
+        self._seconds = defaultdict(float)
+        self._calls = defaultdict(int)
+        self._counters = defaultdict(int)
+
+    def add_callback(self, callback):
+        """ The callback is called with the record (a flat dict) of each generation """
+        self.callbacks.append(callback)
+        return callback
+
+    def watch_cache(self, name, cache):
+        """ Report the hits and misses of a cache with a cache_info() method (functools.lru_cache, SubtreeCache) """
+        self.caches[name] = cache
+
+    @contextmanager
+    def phase(self, name):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self._seconds[name] += perf_counter() - start
+            self._calls[name] += 1
+
+    def count(self, name, value=1):
+        self._counters[name] += value
+
+    def end_generation(self, generation, **values) -> dict:
+        record = {'generation': generation}
+        for name in self.phases + tuple(sorted(set(self._seconds) - set(self.phases))):
+            record['{}_seconds'.format(name)] = self._seconds[name]
+            record['{}_calls'.format(name)] = self._calls[name]
+        record.update(sorted(self._counters.items()))
+        for name, cache in sorted(self.caches.items()):
+            info = cache.cache_info()
+            record['{}_hits'.format(name)] = info.hits
+            record['{}_misses'.format(name)] = info.misses
+            record['{}_hit_rate'.format(name)] = info.hits / max(1, info.hits + info.misses)
+        record['peak_memory'] = peak_memory()
+        record.update(values)
+
+        self.records.append(record)
+        self._seconds.clear()
+        self._calls.clear()
+        self._counters.clear()
+        for callback in self.callbacks:
+            callback(record)
+        return record
+
+
+def phase(instrumentation, name):
+    """ Time a phase with the given Instrumentation, or do nothing if there is none """
+    return nullcontext() if instrumentation is None else instrumentation.phase(name)
+
+
+# ======================================================================================================================
+# SINKS
+
+
+class JsonLinesSink(object):
+    """ Append each record as a line of JSON. Usable as a callback of an Instrumentation """
+
+    def __init__(self, path):
+        self._file = open(path, 'a')
+
+    def __call__(self, record):
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self): return self
+    def __exit__(self, *args): self.close()
+
+
+class CsvSink(object):
+    """
+    Append each record as a row of a CSV file. Missing values are left blank. A record with fields that have no
+    column yet, such as a counter first counted in a later generation, rewrites the file with the new columns
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'a+', newline='')
+        self._file.seek(0)
+        self._fieldnames = next(csv.reader(self._file), [])
+        self._writer = csv.DictWriter(self._file, fieldnames=self._fieldnames)
+
+    def __call__(self, record):
+        new_fields = [name for name in record if name not in self._fieldnames]
+        if new_fields:
+            self._file.seek(0)
+            rows = list(csv.DictReader(self._file))
+            self._fieldnames = self._fieldnames + new_fields
+            self._file.seek(0)
+            self._file.truncate()
+            self._writer = csv.DictWriter(self._file, fieldnames=self._fieldnames)
+            self._writer.writeheader()
+            self._writer.writerows(rows)
+        self._writer.writerow(record)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self): return self
+    def __exit__(self, *args): self.close()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""islands.py: Island model, with one process per island and migration between them."""
+
+__license__     = "MIT"
+__author__      = "José Fonseca"
+__copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
+
+
+# ======================================================================================================================
+# IMPORTS
+
+
+import os
+from queue import Empty
+from multiprocessing import Process, Queue
+
+import numpy as np
+
+from symbolic_regression.population import initialize_population, fitness_decoded_population, spawn_generators, \
+    elite_positions
+from symbolic_regression.engine import epoch, function_name
+
+
+# ======================================================================================================================
+# TOPOLOGY
+
+
+RING_NAMES = {'RING', 'RING_TOPOLOGY'}
+FULLY_CONNECTED_NAMES = {'FULLY_CONNECTED', 'FULL', 'COMPLETE', 'FULLY_CONNECTED_TOPOLOGY'}
+
+
+def migration_targets(topology_name, islands) -> list:
+    """ The islands each island sends its migrants to """
+    if topology_name in RING_NAMES:
+        return [[(island + 1) % islands] if islands > 1 else [] for island in range(islands)]
+    elif topology_name in FULLY_CONNECTED_NAMES:
+        return [[target for target in range(islands) if target != island] for island in range(islands)]
+    else:
+        raise TypeError('UNKNOWN TOPOLOGY: {}'.format(topology_name))
+
+
+# ======================================================================================================================
+# ISLANDS
+# Each island evolves its own population in its own process, with the engine's epoch. Every migration interval, each
+# island sends its best individuals to its targets, as decoded genotypes with their fitness, and waits for the
+# migrants of its sources, which replace its worst individuals. Decoded genotypes are sent as they are, since
+# operators.encode_genotype rounds constants and reads small integer constants as operators. Migrants are received in
+# the order of their source island, so a run is reproducible from its seed whatever the scheduling of the processes.
+
+
+def _island(island, input_array, output_array, generations, population_size, individual_size, fitness_function_name,
+            migration_interval, migration_size, targets, sources, inboxes, results, rng, epoch_configuration):
+    input_size = np.asarray(input_array).reshape(len(output_array), -1).shape[1]
+
+    population = initialize_population(population_size, individual_size, input_size, rng)
+    fitness = fitness_decoded_population(population, input_array, output_array, fitness_function_name)
+    early = []
+    for generation in range(1, generations):
+        population = epoch(population, fitness, rng, input_size, **epoch_configuration)
+        fitness = fitness_decoded_population(population, input_array, output_array, fitness_function_name)
+
+        if (generation % migration_interval == 0) and (generation < generations - 1) and sources:
+            elite = elite_positions(fitness, migration_size)
+            migrants = ([population[position] for position in elite], np.asarray(fitness, dtype=np.float64)[elite])
+            for target in targets:
+                inboxes[target].put((generation, island, migrants))
+
+            # A fast source may already have sent the migrants of the next migration, which wait for their turn
+            received = [message for message in early if message[0] == generation]
+            early = [message for message in early if message[0] != generation]
+            while len(received) < len(sources):
+                message = inboxes[island].get()
+                (received if message[0] == generation else early).append(message)
+            received.sort(key=lambda message: message[1])
+
+            # The migrants replace the worst individuals, from the last
+            immigrants = [migrant for _, _, (migrants, _) in received for migrant in migrants][:len(population)]
+            immigrants_fitness = np.concatenate([migrants_fitness for _, _, (_, migrants_fitness) in received])
+            ranking = np.argsort(np.where(np.isfinite(fitness), fitness, np.inf), kind='stable')
+            worst = ranking[len(ranking) - len(immigrants):]
+            fitness = np.array(fitness, dtype=np.float64)
+            fitness[worst] = immigrants_fitness[:len(immigrants)]
+            for position, immigrant in zip(worst.tolist(), immigrants):
+                population[position] = immigrant
+
+    results.put((island, population, fitness))
+
+
+def evolve_islands(input_array, output_array, generations, islands=None, topology='RING', migration_interval=10,
+                   migration_size=2, population_size=100, individual_size=10, fitness_function='RMSE', seed=None,
+                   **epoch_configuration) -> list:
+    """ Evolve one population per island, each in its own process. Returns the final (population, fitness) of each """
+    islands = islands or os.cpu_count()
+    targets = migration_targets(function_name(topology), islands)
+    sources = [[source for source in range(islands) if island in targets[source]] for island in range(islands)]
+    fitness_function_name = function_name(fitness_function)
+
+    inboxes = [Queue() for _ in range(islands)]
+    results = Queue()
+    processes = [
+        Process(target=_island, args=(
+            island, input_array, output_array, generations, population_size, individual_size, fitness_function_name,
+            migration_interval, migration_size, targets[island], sources[island], inboxes, results, rng,
+            epoch_configuration
+        ))
+        for island, rng in enumerate(spawn_generators(seed, islands))
+    ]
+    for process in processes:
+        process.start()
+
+    # An island that fails would leave its neighbours waiting for its migrants forever, so all of them are stopped
+    final = {}
+    while len(final) < islands:
+        try:
+            island, population, fitness = results.get(timeout=1.0)
+            final[island] = (population, fitness)
+        except Empty:
+            failed = [island for island, process in enumerate(processes) if process.exitcode not in (None, 0)]
+            if failed:
+                for process in processes:
+                    process.terminate()
+                raise RuntimeError('ISLANDS {} FAILED'.format(failed))
+    for process in processes:
+        process.join()
+    return [final[island] for island in range(islands)]
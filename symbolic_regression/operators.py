@@ -13,6 +13,9 @@ __copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
 
 
 import re
+import math
+from functools import lru_cache
+
 import numpy as np
 
 from symbolic_regression import MIN_VALUE, MAX_VALUE
@@ -39,13 +42,19 @@ def PASS(arg): return arg
 def ADD(arg_a, arg_b): return arg_a + arg_b
 def SUBTRACT(arg_a, arg_b): return arg_a - arg_b
 def MULTIPLY(arg_a, arg_b): return arg_a * arg_b
-def DIVIDE(arg_a, arg_b): return (arg_a / arg_b) if (arg_b != 0) else arg_a
+def DIVIDE(arg_a, arg_b): return _where_nonzero(np.divide, arg_a, arg_b)
 
 # Dual-Argument
 def POWER(arg_a, arg_b): return np.power(arg_a, arg_b)
 def ROOT(arg_a, arg_b): return np.power(arg_a, 1.0/arg_b)
 def LOG(arg_a, arg_b): return np.log(arg_a, arg_b)
-def MOD(arg_a, arg_b): return (arg_a % arg_b) if (arg_b != 0) else arg_a
+def MOD(arg_a, arg_b): return _where_nonzero(np.mod, arg_a, arg_b)
+
+
+def _where_nonzero(function, arg_a, arg_b):
+    """ Apply the function where arg_b is not zero, keeping arg_a elsewhere. Works for scalars and arrays alike """
+    out = np.array(np.broadcast_to(arg_a, np.broadcast(arg_a, arg_b).shape), dtype=float)
+    return function(arg_a, arg_b, out=out, where=(np.asarray(arg_b) != 0))[()]
 
 # Terminals
 INPUT = ['INPUT']
@@ -98,6 +107,128 @@ def GRAMMAR(individual_size:int):
                  + 'PLUS_ONE|TERMINAL|INPUT;TERMINAL|INPUT')
 
 
+# ======================================================================================================================
+# OPCODES
+
+
+# Operators are numbered by their position in OPERATORS, followed by the inputs (INPUT_i is OPCODE_INPUT+i)
+OPCODE_CONSTANT = -1
+OPCODE_INPUT = len(OPERATORS)
+OPCODES = {operator: opcode for opcode, operator in enumerate(OPERATORS)}
+OPERATOR_FUNCTIONS = [globals()[operator] for operator in OPERATORS]
+OPERATOR_ARITY = [1 if operator in PLUS_ONE else 2 for operator in OPERATORS]
+
+
+def opcode_arity(opcode:int) -> int:
+    return OPERATOR_ARITY[opcode] if 0 <= opcode < OPCODE_INPUT else 0
+
+
+def gene_to_opcode(gene:str) -> tuple:
+    """ Returns the (opcode, constant) pair of a decoded gene. The constant is 0.0 for non-constant genes """
+    if gene.startswith('INPUT_'):
+        return OPCODE_INPUT + int(gene[6:]), 0.0
+    elif gene.startswith('<'):
+        return OPCODE_CONSTANT, float(gene[1:-1])
+    elif gene in OPCODES:
+        return OPCODES[gene], 0.0
+    else:
+        raise TypeError('UNKNOWN GENE {}'.format(gene))
+
+
+# ======================================================================================================================
+# ARRAY KERNELS
+# Kernels are tables of operators indexed by opcode, selectable as the kernels of genotype.execute_program. The
+# OPERATOR_KERNELS are the operators themselves. The PROTECTED_KERNELS clip every result to [MIN_VALUE, MAX_VALUE],
+# and their SQRT takes the square root of the absolute value, so finite inputs never produce infinities or NaNs.
+# Kernels return new arrays like the operators do: writing into preallocated buffers measured no faster, as the copies
+# and masks it needs cost as much as the allocations it saves.
+
+
+OPERATOR_KERNELS = OPERATOR_FUNCTIONS
+
+
+def _protected(function):
+    def protected_kernel(*args):
+        result = function(*args)
+        # Results are clipped in place, unless they are one of the arguments (PASS) or a scalar
+        if isinstance(result, np.ndarray) and all(result is not arg for arg in args):
+            return np.clip(result, MIN_VALUE, MAX_VALUE, out=result)
+        return np.clip(result, MIN_VALUE, MAX_VALUE)
+    return protected_kernel
+
+
+PROTECTED_KERNELS = [
+    _protected(lambda arg: np.sqrt(np.abs(arg))) if operator == 'SQRT' else _protected(function)
+    for operator, function in zip(OPERATORS, OPERATOR_FUNCTIONS)
+]
+
+
+# ======================================================================================================================
+# COMPILED GRAMMAR
+# GRAMMAR(n) lists, for each position, the families a gene may be drawn from, each with the same chance (repeated
+# families weigh more), and then a member of the family is drawn, again with the same chance. The compiled grammar
+# of a size holds the resulting chance of each opcode at each position. Its columns are the operators, by opcode,
+# then any input (column OPCODE_INPUT) and the constants (last column), as listed by GRAMMAR_OPCODES.
+
+
+GRAMMAR_FAMILIES = {
+    'TERMINAL': TERMINAL, 'INPUT': INPUT, 'CONSTANT': ['CONSTANT'],
+    'PLUS_ONE': PLUS_ONE, 'PLUS_TWO': PLUS_TWO, 'PLUS_TWO_LIGHT': PLUS_TWO_LIGHT
+}
+GRAMMAR_OPCODES = np.asarray(list(range(OPCODE_INPUT + 1)) + [OPCODE_CONSTANT], dtype=np.int16)
+_GRAMMAR_COLUMNS = dict(zip(OPERATORS + ['INPUT', 'CONSTANT'], range(len(GRAMMAR_OPCODES))))
+
+
+@lru_cache(maxsize=256)
+def _grammar_weights(individual_size:int) -> np.ndarray:
+    """ Integer weights of each opcode at each position, over a common denominator (their sum at each position) """
+    levels = [level.split('|') for level in GRAMMAR(individual_size).split(';')]
+    denominator = math.lcm(*[len(families) * len(GRAMMAR_FAMILIES[family])
+                             for families in levels for family in families])
+    weights = np.zeros((len(levels), len(GRAMMAR_OPCODES)), dtype=np.int64)
+    for position, families in enumerate(levels):
+        for family in families:
+            members = GRAMMAR_FAMILIES[family]
+            for member in members:
+                weights[position, _GRAMMAR_COLUMNS[member]] += denominator // (len(families) * len(members))
+    weights.setflags(write=False)
+    return weights
+
+
+@lru_cache(maxsize=256)
+def compile_grammar(individual_size:int) -> np.ndarray:
+    """ The (positions x len(GRAMMAR_OPCODES)) matrix of the chance of each opcode at each position. Read-only """
+    weights = _grammar_weights(individual_size)
+    probabilities = weights / weights.sum(axis=1, keepdims=True)
+    probabilities.setflags(write=False)
+    return probabilities
+
+
+@lru_cache(maxsize=256)
+def grammar_cumulative(individual_size:int) -> list:
+    """ Cumulative weights of each position of the compiled grammar, as lists for random.choices(cum_weights=) """
+    return _grammar_weights(individual_size).cumsum(axis=1).tolist()
+
+
+@lru_cache(maxsize=256)
+def _grammar_tables(individual_size:int) -> list:
+    """ One table per group of positions with the same weights, each column repeated as many times as its weight """
+    rows, groups = np.unique(_grammar_weights(individual_size), axis=0, return_inverse=True)
+    return [(np.flatnonzero(groups.reshape(-1) == group), np.repeat(GRAMMAR_OPCODES, row))
+            for group, row in enumerate(rows)]
+
+
+def sample_grammar_opcodes(count:int, individual_size:int, input_size:int, rng) -> np.ndarray:
+    """ Draw the opcodes of count genotypes at once, as a (count x individual_size) int16 matrix """
+    opcodes = np.empty((count, len(_grammar_weights(individual_size))), dtype=np.int16)
+    for positions, table in _grammar_tables(individual_size):
+        opcodes[:, positions] = table[rng.integers(0, len(table), (count, len(positions)))]
+
+    is_input = opcodes == OPCODE_INPUT
+    opcodes[is_input] += rng.integers(0, input_size, np.count_nonzero(is_input)).astype(np.int16)
+    return opcodes
+
+
 # ======================================================================================================================
 # ENCODE/DECODE
 
@@ -138,6 +269,8 @@ class Xlator(dict):
     Source: https://www.oreilly.com/library/view/python-cookbook/0596001673/ch03s15.html
     """
 
+    _regex = None
+
     def _make_regex(self):
         """ Build re object based on the keys of the current dictionary """
         return re.compile("|".join(map(re.escape, self.keys(  ))))
@@ -147,22 +280,16 @@ class Xlator(dict):
         return self[match.group(0)]
 
     def xlat(self, text):
-        """ Translate text, returns the modified text. """
-        return self._make_regex(  ).sub(self, text)
-
-
-# Encoding
-ENCODING_OPERATORS = {
-    operator: encode_value(position)
-    for position, operator in enumerate(OPERATORS+[f'INPUT_{i}' for i in range(10)])
-}
-DECODING_OPERATORS = {value: operator for operator, value in ENCODING_OPERATORS.items()}
+        """ Translate text, returns the modified text. The regex is compiled on the first call only. """
+        if self._regex is None:
+            self._regex = self._make_regex(  )
+        return self._regex.sub(self, text)
 
 
 def encode_genotype(genotype):
 
     # Replace the operators
-    genotype = Xlator(ENCODING_OPERATORS).xlat(genotype).split(';')
+    genotype = _encoding_tables()['ENCODING_XLATOR'].xlat(genotype).split(';')
 
     # Replace the constants and encode as binary
     return ''.join([
@@ -172,7 +299,152 @@ def encode_genotype(genotype):
 
 
 def decode_genotype(genotype):
-    genotype = Xlator(DECODING_OPERATORS).xlat(
+    genotype = _encoding_tables()['DECODING_XLATOR'].xlat(
         ';'.join([genotype[64*i:64*(i+1)] for i in range(int(len(genotype)/64))])
     )
     return ';'.join([(f'<{decode_value(gen)}>' if gen[0] in '01' else gen) for gen in genotype.split(';')])
+
+
+# ======================================================================================================================
+# BATCH ENCODE/DECODE
+# Encoded genes as uint64 words, whose big-endian bits are the '0'/'1' characters of encode_value
+
+
+_EVEN_BITS = [  # Masks for spreading a 32-bit integer over the even bits of a 64-bit word
+    (16, np.uint64(0x0000FFFF0000FFFF)),
+    (8, np.uint64(0x00FF00FF00FF00FF)),
+    (4, np.uint64(0x0F0F0F0F0F0F0F0F)),
+    (2, np.uint64(0x3333333333333333)),
+    (1, np.uint64(0x5555555555555555)),
+]
+_REVERSE_BITS = [  # Masks for reversing the bits of a 32-bit integer
+    (1, np.uint64(0x55555555)),
+    (2, np.uint64(0x33333333)),
+    (4, np.uint64(0x0F0F0F0F)),
+    (8, np.uint64(0x00FF00FF)),
+    (16, np.uint64(0x0000FFFF)),
+]
+_LOWER_HALF = np.uint64(0xFFFFFFFF)
+
+
+def _spread_bits(words):
+    for shift, mask in _EVEN_BITS:
+        words = (words | (words << np.uint64(shift))) & mask
+    return words
+
+
+def _compact_bits(words):
+    words = words & _EVEN_BITS[-1][1]
+    for shift, mask in reversed(_EVEN_BITS[:-1]):
+        words = (words | (words >> np.uint64(shift // 2))) & mask
+    return (words | (words >> np.uint64(16))) & _LOWER_HALF
+
+
+def _reverse_bits(words):
+    for shift, mask in _REVERSE_BITS:
+        words = ((words >> np.uint64(shift)) & mask) | ((words & mask) << np.uint64(shift))
+    return words
+
+
+def encode_values(values) -> np.ndarray:
+    """ Vectorized encode_value, returning uint64 words instead of '0'/'1' strings """
+    values = np.clip(np.asarray(values, dtype=np.float64), MIN_VALUE, MAX_VALUE)
+    # Outside +-MAX_VALUE/1e6 the scalar version goes negative and is undefined. Here the integers saturate instead
+    words = np.clip((values * 1e6) + MAX_VALUE, 0, 2.0**64 - 2**11).astype(np.uint64)
+    words = words ^ (words >> np.uint64(1))  # Gray code
+    # Interleave the bits to improve locality: the upper half on the even bits, the reversed lower half on the odd
+    return _spread_bits(words >> np.uint64(32)) | (_spread_bits(_reverse_bits(words & _LOWER_HALF)) << np.uint64(1))
+
+
+def decode_values(words) -> np.ndarray:
+    """ Vectorized decode_value, over uint64 words """
+    words = np.asarray(words, dtype=np.uint64)
+    words = (_compact_bits(words) << np.uint64(32)) | _reverse_bits(_compact_bits(words >> np.uint64(1)))
+    for shift in (1, 2, 4, 8, 16, 32):
+        words = words ^ (words >> np.uint64(shift))  # Undo the gray code
+    return (words.astype(np.float64) - MAX_VALUE) / 1e6
+
+
+def words_to_bits(words) -> str:
+    """ The '0'/'1' text of the uint64 words, 64 characters per word """
+    bits = np.unpackbits(np.asarray(words, dtype='>u8').view(np.uint8))
+    return (bits + ord('0')).tobytes().decode('ascii')
+
+
+def bits_to_words(bits:str) -> np.ndarray:
+    """ The uint64 words of a '0'/'1' text, such as the ones returned by encode_genotype """
+    bits = np.frombuffer(bits.encode('ascii'), dtype=np.uint8) - ord('0')
+    return np.packbits(bits).view('>u8').astype(np.uint64)
+
+
+def encode_genotypes_to_words(genotypes) -> list:
+    """ Encode many decoded genotypes at once, returning one uint64 array of words per genotype """
+    genes = ';'.join(genotypes).split(';')
+    is_constant = np.asarray([gene.startswith('<') for gene in genes], dtype=bool)
+    words = np.empty(len(genes), dtype=np.uint64)
+    words[is_constant] = encode_values([float(gene[1:-1]) for gene, constant in zip(genes, is_constant) if constant])
+    try:
+        encoding_words = _encoding_tables()['ENCODING_WORDS']
+        words[~is_constant] = [encoding_words[gene] for gene, constant in zip(genes, is_constant) if not constant]
+    except KeyError as error:
+        raise TypeError('UNKNOWN GENE {}'.format(error.args[0]))
+    return np.split(words, np.cumsum([genotype.count(';') + 1 for genotype in genotypes])[:-1])
+
+
+def decode_genotypes_from_words(genotypes) -> list:
+    """ Decode many genotypes given as uint64 arrays of words at once, returning decoded strings """
+    lengths = [len(words) for words in genotypes]
+    words = np.concatenate(genotypes) if genotypes else np.empty(0, dtype=np.uint64)
+    tables = _encoding_tables()
+    is_operator = np.isin(words, tables['OPERATOR_WORDS'])
+    values = iter(decode_values(words[~is_operator]).tolist())
+    genes = [tables['DECODING_WORDS'][word] if operator else '<{}>'.format(next(values))
+             for word, operator in zip(words.tolist(), is_operator.tolist())]
+    ends = np.cumsum(lengths).tolist()
+    return [';'.join(genes[end-length:end]) for end, length in zip(ends, lengths)]
+
+
+def encode_genotypes(genotypes) -> list:
+    """ Same as [encode_genotype(genotype) for genotype in genotypes], computed for all genes at once """
+    return [words_to_bits(words) for words in encode_genotypes_to_words(genotypes)]
+
+
+def decode_genotypes(genotypes) -> list:
+    """ Same as [decode_genotype(genotype) for genotype in genotypes], computed for all genes at once """
+    return decode_genotypes_from_words([bits_to_words(genotype) for genotype in genotypes])
+
+
+# ======================================================================================================================
+# ENCODING TABLES
+# The encoded genes of the operators and inputs, as text and as words. They are built on first use, since most
+# short-lived processes never encode anything, and read as module attributes (operators.ENCODING_OPERATORS, ...).
+
+
+_ENCODING_TABLES = {'ENCODING_OPERATORS', 'DECODING_OPERATORS', 'ENCODING_XLATOR', 'DECODING_XLATOR',
+                    'ENCODING_WORDS', 'DECODING_WORDS', 'OPERATOR_WORDS'}
+
+
+@lru_cache(maxsize=None)
+def _encoding_tables() -> dict:
+    encoding_operators = {
+        operator: encode_value(position)
+        for position, operator in enumerate(OPERATORS+[f'INPUT_{i}' for i in range(10)])
+    }
+    decoding_operators = {value: operator for operator, value in encoding_operators.items()}
+    encoding_words = {operator: int(bits_to_words(value)[0]) for operator, value in encoding_operators.items()}
+    decoding_words = {value: operator for operator, value in encoding_words.items()}
+    return {
+        'ENCODING_OPERATORS': encoding_operators,
+        'DECODING_OPERATORS': decoding_operators,
+        'ENCODING_XLATOR': Xlator(encoding_operators),
+        'DECODING_XLATOR': Xlator(decoding_operators),
+        'ENCODING_WORDS': encoding_words,
+        'DECODING_WORDS': decoding_words,
+        'OPERATOR_WORDS': np.asarray(sorted(decoding_words), dtype=np.uint64),
+    }
+
+
+def __getattr__(name):
+    if name in _ENCODING_TABLES:
+        return _encoding_tables()[name]
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""optimization.py: Linear scaling and gradient fitting of the constants of genotypes."""
+
+__license__     = "MIT"
+__author__      = "José Fonseca"
+__copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
+
+
+# ======================================================================================================================
+# IMPORTS
+
+
+import re
+
+import numpy as np
+
+from symbolic_regression import operators
+from symbolic_regression.genome import pack_decoded_genotype, unpack_genotype
+from symbolic_regression.genotype import compile_packed_genotype, input_columns, execute_program
+from symbolic_regression.population import fitness_decoded_population, elite_positions
+from symbolic_regression.simplify import simplify_packed_genotype
+
+
+# ======================================================================================================================
+# DERIVATIVES
+# Forward-mode derivatives of each operator: given the values of the arguments and their derivatives with regard to
+# every parameter (one row per parameter), returns the derivatives of the result. Constant subexpressions evaluate to
+# scalars, so values broadcast against the (parameters x rows) derivatives.
+# Gene i is only read by genes i-1 and i-2, so the values and derivatives of the genes after i+1 are dropped once gene i
+# is computed. At most three (parameters x rows) derivatives are then kept at a time, whatever the size of the program.
+
+
+_TAU = np.pi * 2.0
+
+
+def _divide_derivative(a, b, da, db):
+    nonzero = np.asarray(b) != 0  # DIVIDE keeps its first argument where the second is zero
+    safe_b = np.where(nonzero, b, 1.0)
+    return np.where(nonzero, (da * safe_b - a * db) / safe_b**2, da)
+
+
+def _mod_derivative(a, b, da, db):
+    nonzero = np.asarray(b) != 0  # MOD keeps its first argument where the second is zero
+    return np.where(nonzero, da - np.floor(a / np.where(nonzero, b, 1.0)) * db, da)
+
+
+DERIVATIVES = {
+    'INVERSE': lambda a, da: -da,
+    'EXPONENTIAL': lambda a, da: np.exp(a) * da,
+    'SIN': lambda a, da: np.cos(a * _TAU) * _TAU * da,
+    'COSIN': lambda a, da: -np.sin(a * _TAU) * _TAU * da,
+    'TANGENT': lambda a, da: _TAU / np.cos(a * _TAU)**2 * da,
+    'SQUARE': lambda a, da: 2.0 * a * da,
+    'CUBE': lambda a, da: 3.0 * np.power(a, 2) * da,
+    'SQRT': lambda a, da: 0.5 / np.sqrt(a) * da,
+    'MODULO': lambda a, da: np.sign(a) * da,
+    'PASS': lambda a, da: da,
+    'ADD': lambda a, b, da, db: da + db,
+    'SUBTRACT': lambda a, b, da, db: da - db,
+    'MULTIPLY': lambda a, b, da, db: b * da + a * db,
+    'DIVIDE': _divide_derivative,
+    'MOD': _mod_derivative,
+}
+
+
+def differentiate_program(program, columns, parameters) -> tuple:
+    """
+    Execute a compiled genotype over the (inputs x rows) columns, along with the derivatives of its output with
+    regard to the constants at the given positions. Returns the outputs (rows) and the (parameters x rows) jacobian.
+    """
+    opcodes, constants, order = program
+    opcode_list = opcodes.tolist()
+    rows = columns.shape[1]
+    values = [None] * len(opcode_list)
+    derivatives = [None] * len(opcode_list)
+    no_derivative = np.zeros((len(parameters), 1))
+    kept = len(opcode_list)
+
+    with np.errstate(all='ignore'):
+        for position in order.tolist():
+            opcode = opcode_list[position]
+            if opcode == operators.OPCODE_CONSTANT:
+                values[position] = constants[position]
+                derivatives[position] = (np.asarray([[float(parameter == position)] for parameter in parameters])
+                                         if position in parameters else no_derivative)
+            elif opcode >= operators.OPCODE_INPUT:
+                values[position] = columns[opcode - operators.OPCODE_INPUT]
+                derivatives[position] = no_derivative
+            else:
+                name = operators.OPERATORS[opcode]
+                if name not in DERIVATIVES:
+                    raise TypeError('UNKNOWN DERIVATIVE OF OPERATOR: {}'.format(name))
+                arguments = range(position+1, position+1+operators.OPERATOR_ARITY[opcode])
+                values[position] = operators.OPERATOR_FUNCTIONS[opcode](*[values[argument] for argument in arguments])
+                derivatives[position] = DERIVATIVES[name](*[values[argument] for argument in arguments],
+                                                          *[derivatives[argument] for argument in arguments])
+
+            for stale in range(position+2, kept):
+                values[stale], derivatives[stale] = None, None
+            kept = min(kept, position+2)
+
+    return (np.broadcast_to(values[0], (rows,)).astype(np.float64),
+            np.broadcast_to(derivatives[0], (len(parameters), rows)).astype(np.float64))
+
+
+# ======================================================================================================================
+# LINEAR SCALING
+# The output of a genotype f is scaled as a + b*f, where a and b are the closed-form least-squares intercept and
+# slope. The scaled genotype is f prefixed with ADD;<a>;MULTIPLY;<b>, since ADD reads <a> and MULTIPLY, which reads
+# <b> and the root of f. A genotype that already has the prefix gets its a and b fitted again instead.
+# The prefix takes 4 genes, and the size of the genotype is kept: f must then fit in its size minus 4 genes, as it
+# is, without the genes it never evaluates, or simplified (see simplify.py). Otherwise, the genotype is not scaled.
+
+
+_SCALED = re.compile(r'^ADD;<[^>]*>;MULTIPLY;<[^>]*>;')
+_PREFIX_SIZE = 4
+
+
+def _fit_size(decoded_genotype, size, kernels=None) -> str:
+    """ The genotype in exactly size genes, evaluating to the same values, or None if it does not fit """
+    opcodes, constants = pack_decoded_genotype(decoded_genotype)
+    if size < 1:
+        return None
+    elif int(compile_packed_genotype(opcodes, constants)[2][0]) < size:
+        # Genes that would read past the end are never evaluated, and become constants so that mutation can't reach them
+        return ';'.join([gene if position + operators.opcode_arity(opcode) < size else '<0.0>'
+                         for position, (gene, opcode) in enumerate(zip(decoded_genotype.split(';')[:size],
+                                                                        opcodes.tolist()))])
+    opcodes, constants = simplify_packed_genotype(opcodes, constants, size, kernels)
+    return unpack_genotype(opcodes, constants) if len(opcodes) == size else None
+
+
+def linear_scaling(decoded_genotype, input_array, output_array, kernels=None) -> str:
+    """ Returns the genotype with its output scaled to best fit the output array, keeping its size """
+    genotype = _SCALED.sub('', decoded_genotype)
+    if genotype == decoded_genotype:
+        genotype = _fit_size(genotype, decoded_genotype.count(';') + 1 - _PREFIX_SIZE, kernels)
+        if genotype is None:
+            return decoded_genotype
+    opcodes, constants = pack_decoded_genotype(genotype)
+    with np.errstate(all='ignore'):
+        observed_outputs = execute_program(compile_packed_genotype(opcodes, constants), input_columns(input_array),
+                                           kernels=kernels)
+        output_array = np.asarray(output_array, dtype=np.float64)
+        variance = observed_outputs.var()
+        if not (np.isfinite(variance) and (variance > 0)):
+            return decoded_genotype
+        slope = ((observed_outputs - observed_outputs.mean()) * (output_array - output_array.mean())).mean() / variance
+        intercept = output_array.mean() - slope * observed_outputs.mean()
+    if not (np.isfinite(slope) and np.isfinite(intercept)):
+        return decoded_genotype
+    return 'ADD;<{}>;MULTIPLY;<{}>;{}'.format(float(intercept), float(slope), genotype)
+
+
+# ======================================================================================================================
+# CONSTANT OPTIMIZATION
+
+
+def optimize_constants(decoded_genotype, input_array, output_array, iterations=10, damping=1e-3,
+                       kernels=None) -> str:
+    """ Fit the constants of the genotype with Levenberg-Marquardt. The result never fits worse than the genotype """
+    opcodes, constants = pack_decoded_genotype(decoded_genotype)
+    program = compile_packed_genotype(opcodes, constants)
+    parameters = [position for position in program[2].tolist() if opcodes[position] == operators.OPCODE_CONSTANT]
+    if not parameters:
+        return decoded_genotype
+    columns = input_columns(input_array)
+    output_array = np.asarray(output_array, dtype=np.float64)
+
+    def residuals(values):
+        constants[parameters] = values
+        observed_outputs, jacobian = differentiate_program(program, columns, parameters)
+        if kernels is not None:
+            observed_outputs = execute_program(program, columns, kernels=kernels)
+        errors = output_array - observed_outputs
+        return errors, jacobian, errors @ errors
+
+    values = constants[parameters].copy()
+    errors, jacobian, squared_error = residuals(values)
+    for _ in range(iterations):
+        if not (np.isfinite(squared_error) and np.isfinite(jacobian).all()):
+            break
+        normal_matrix = jacobian @ jacobian.T
+        gradient = jacobian @ errors
+        try:
+            step = np.linalg.solve(normal_matrix + damping * np.diag(np.diag(normal_matrix) + 1e-12), gradient)
+        except np.linalg.LinAlgError:
+            break
+        candidate_errors, candidate_jacobian, candidate_squared_error = residuals(values + step)
+        if np.isfinite(candidate_squared_error) and (candidate_squared_error < squared_error):
+            values, errors, jacobian, squared_error = (values + step, candidate_errors, candidate_jacobian,
+                                                       candidate_squared_error)
+            damping /= 10.0
+        else:
+            damping *= 10.0
+
+    constants[parameters] = values
+    return unpack_genotype(opcodes, constants)
+
+
+def optimize_population(decoded_population, fitness, input_array, output_array, fitness_function_name,
+                        optimization_size, scaling=True, iterations=10, kernels=None):
+    """
+    Local optimization of the optimization_size best fit individuals: linear scaling of their output, if scaling,
+    then Levenberg-Marquardt on their constants. Returns the new population and its fitness.
+    """
+    positions = elite_positions(fitness, optimization_size)
+    if len(positions) == 0:
+        return decoded_population, fitness
+
+    optimized = []
+    for position in positions.tolist():
+        decoded_genotype = decoded_population[position]
+        if scaling:
+            decoded_genotype = linear_scaling(decoded_genotype, input_array, output_array, kernels)
+        if iterations > 0:
+            decoded_genotype = optimize_constants(decoded_genotype, input_array, output_array, iterations,
+                                                  kernels=kernels)
+        optimized.append(decoded_genotype)
+
+    decoded_population, fitness = list(decoded_population), np.array(fitness, dtype=np.float64)
+    optimized_fitness = fitness_decoded_population(optimized, input_array, output_array, fitness_function_name,
+                                                   kernels=kernels)
+    for position, decoded_genotype, value in zip(positions.tolist(), optimized, optimized_fitness.tolist()):
+        if np.isfinite(value) and not (value > fitness[position]):
+            decoded_population[position], fitness[position] = decoded_genotype, value
+    return decoded_population, fitness
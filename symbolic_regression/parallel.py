@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""parallel.py: Fitness evaluation by a pool of local processes over shared memory."""
+
+__license__     = "MIT"
+__author__      = "José Fonseca"
+__copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
+
+
+# ======================================================================================================================
+# IMPORTS
+
+
+import os
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from symbolic_regression.genotype import compile_decoded_genotype, compile_packed_genotype, input_columns
+from symbolic_regression.population import fitness_compiled_population, kernels_name, KERNELS_NAMES
+
+
+# ======================================================================================================================
+# SHARED DATASET
+
+
+def share_array(array):
+    """ Copy the array into a new shared memory block. Returns the block and its (name, shape, dtype) descriptor """
+    block = SharedMemory(create=True, size=max(1, array.nbytes))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def attach_array(descriptor):
+    """ Attach to a shared memory block created by share_array, without copying it. Returns the block and array """
+    name, shape, dtype = descriptor
+    block = SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+class SharedDataset(object):
+    """ The input columns and the output array of a dataset, copied ONCE into shared memory """
+
+    def __init__(self, input_array, output_array):
+        self._input_block, self.input_descriptor = share_array(input_columns(input_array))
+        self._output_block, self.output_descriptor = share_array(np.asarray(output_array, dtype=np.float64))
+
+    def close(self):
+        for block in (self._input_block, self._output_block):
+            block.close()
+            block.unlink()
+
+    def __enter__(self): return self
+    def __exit__(self, *args): self.close()
+
+
+# ======================================================================================================================
+# WORKERS
+
+
+_WORKER = {}
+
+
+def _initialize_worker(input_descriptor, output_descriptor, fitness_function_name, batch_size, kernels):
+    _WORKER['input_block'], _WORKER['columns'] = attach_array(input_descriptor)
+    _WORKER['output_block'], _WORKER['output_array'] = attach_array(output_descriptor)
+    _WORKER['fitness_function_name'] = fitness_function_name
+    _WORKER['batch_size'] = batch_size
+    _WORKER['kernels'] = KERNELS_NAMES[kernels]
+
+
+def _worker_fitness(arguments):
+    genotypes, packed = arguments
+    if packed:
+        programs = [compile_packed_genotype(genome['opcodes'], genome['constants']) for genome in genotypes]
+    else:
+        programs = [compile_decoded_genotype(genotype) for genotype in genotypes]
+    return fitness_compiled_population(
+        programs, _WORKER['columns'], _WORKER['output_array'], _WORKER['fitness_function_name'],
+        batch_size=_WORKER['batch_size'], kernels=_WORKER['kernels']
+    )
+
+
+class FitnessPool(object):
+    """ Fitness evaluation by a pool of processes, with the dataset in shared memory and the kernels sent by name """
+
+    def __init__(self, input_array, output_array, fitness_function_name, processes=None, chunks_per_process=4,
+                 batch_size=None, kernels=None):
+        self.processes = processes or os.cpu_count()
+        self.chunks_per_process = chunks_per_process
+        self.dataset = SharedDataset(input_array, output_array)
+        self._pool = Pool(
+            self.processes, initializer=_initialize_worker,
+            initargs=(self.dataset.input_descriptor, self.dataset.output_descriptor, fitness_function_name, batch_size,
+                      kernels_name(kernels))
+        )
+
+    def fitness(self, population, packed=False):
+        """ Fitness of a list of decoded genotypes, or of a packed population (see genome.py), faster to send """
+        if len(population) == 0:
+            return np.empty(0, dtype=np.float64)
+        chunk_size = -(-len(population) // (self.processes * self.chunks_per_process))
+        chunks = [(population[start:start+chunk_size], packed) for start in range(0, len(population), chunk_size)]
+        return np.concatenate(self._pool.map(_worker_fitness, chunks))
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+        self.dataset.close()
+
+    def __enter__(self): return self
+    def __exit__(self, *args): self.close()
@@ -12,10 +12,16 @@ __copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
 # IMPORTS
 
 
-import pandas as pd
-from numpy import asarray, power, subtract
+from numpy import arange, argmax, argmin, argpartition, argsort, asarray, concatenate, count_nonzero, empty, float64, \
+    inf, isfinite, power, sort, subtract, square, where
+from numpy.random import default_rng, SeedSequence
 
-from symbolic_regression.genotype import generate_decoded_genotype, evaluate_decoded_genotype
+from symbolic_regression.cache import genotype_key, genome_key
+from symbolic_regression.operators import OPERATOR_KERNELS, PROTECTED_KERNELS
+from symbolic_regression.genome import unpack_population
+from symbolic_regression.genotype import generate_decoded_genotype, generate_packed_population, \
+    compile_decoded_genotype, compile_packed_genotype, evaluate_compiled_genotype, input_columns, execute_program, \
+    mutate_decoded_genotype
 
 
 # ======================================================================================================================
@@ -23,33 +29,316 @@ from symbolic_regression.genotype import generate_decoded_genotype, evaluate_dec
 
 
 def create_decoded_population(population_size, individual_size, input_size=1):
-    return [generate_decoded_genotype(individual_size, input_size) for _ in population_size]
+    return [generate_decoded_genotype(individual_size, input_size) for _ in range(population_size)]
+
+
+def spawn_generators(seed, count) -> list:
+    """ Independent NumPy generators, one per worker, all derived from the seed (see numpy.random.SeedSequence) """
+    seed_sequence = seed.bit_generator.seed_seq if hasattr(seed, 'bit_generator') else SeedSequence(seed)
+    return [default_rng(child) for child in seed_sequence.spawn(count)]
+
+
+def initialize_population(population_size, individual_size, input_size=1, seed=None, packed=False, streams=1):
+    """ Create a population with a NumPy generator, packed (see genome.py) or as a list of decoded genotypes """
+    # Each of several streams draws its own slice of the population from its own spawned generator, so a slice is the
+    # same whichever process draws it
+    if streams > 1:
+        bounds = [population_size * stream // streams for stream in range(streams + 1)]
+        genomes = concatenate([
+            generate_packed_population(end - start, individual_size, input_size, rng)
+            for start, end, rng in zip(bounds[:-1], bounds[1:], spawn_generators(seed, streams))
+        ])
+    else:
+        genomes = generate_packed_population(population_size, individual_size, input_size, default_rng(seed))
+    return genomes if packed else unpack_population(genomes)
 
 
 # ======================================================================================================================
 # FITNESS
 
 
-def fitness_decoded_genotype(decoded_genotype, input_array, output_array, fitness_function_name):
+MSE_NAMES = {'MSE', 'MSD', 'MEAN_SQUARE_ERROR', 'MEAN_SQUARE_DEVIATION',
+             'MEAN_SQUARED_ERROR', 'MEAN_SQUARED_DEVIATION'}
+RMSE_NAMES = {'RMSE', 'RMSD', 'ROOT_MEAN_SQUARE_ERROR', 'ROOT_MEAN_SQUARE_DEVIATION',
+              'ROOT_MEAN_SQUARED_ERROR', 'ROOT_MEAN_SQUARED_DEVIATION'}
+
 
-    # Compute the output for every input
-    observed_outputs = asarray([
-        evaluate_decoded_genotype(decoded_genotype, *inp if isinstance(inp, (list, tuple)) else inp)
-        for inp in input_array
-    ], dtype=float)
+def reduce_fitness(observed_outputs, output_array, fitness_function_name, axis=None):
 
     # Compute the fitness function
-    if fitness_function_name in {'MSE', 'MSD', 'MEAN_SQUARE_ERROR', 'MEAN_SQUARE_DEVIATION',
-                                 'MEAN_SQUARED_ERROR', 'MEAN_SQUARED_DEVIATION'}:
-        fitness = power(subtract(output_array, observed_outputs), 2).mean()
-    elif fitness_function_name in {'RMSE', 'RMSD', 'ROOT_MEAN_SQUARE_ERROR', 'ROOT_MEAN_SQUARE_DEVIATION',
-                                   'ROOT_MEAN_SQUARED_ERROR', 'ROOT_MEAN_SQUARED_DEVIATION'}:
-        fitness = power(power(subtract(output_array, observed_outputs), 2).mean(), 1/2)
+    if fitness_function_name in MSE_NAMES:
+        fitness = power(subtract(output_array, observed_outputs), 2).mean(axis=axis)
+    elif fitness_function_name in RMSE_NAMES:
+        fitness = power(power(subtract(output_array, observed_outputs), 2).mean(axis=axis), 1/2)
     else:
         raise TypeError('UNKNOWN FITNESS FUNCTION: {}'.format(fitness_function_name))
 
     return fitness
 
 
+def fitness_decoded_genotype(decoded_genotype, input_array, output_array, fitness_function_name):
+
+    # Compute the output for every input at once
+    observed_outputs = evaluate_compiled_genotype(compile_decoded_genotype(decoded_genotype), input_array)
+
+    return reduce_fitness(observed_outputs, output_array, fitness_function_name)
+
+
+KERNELS_NAMES = {'NONE': None, 'OPERATOR': OPERATOR_KERNELS, 'PROTECTED': PROTECTED_KERNELS}
+
+
+def kernels_name(kernels) -> str:
+    """ Name of a kernel table of operators.py, to send it to other processes """
+    for name, table in KERNELS_NAMES.items():
+        if kernels is table:
+            return name
+    raise TypeError('UNKNOWN KERNELS: {}'.format(type(kernels).__name__))
+
+
+def kernels_variant(kernels) -> str:
+    """ Name of the results of a kernel table, for the caches. The operator kernels compute the same as none """
+    return 'PROTECTED' if kernels_name(kernels) == 'PROTECTED' else ''
+
+
+def squared_error_sums(programs, columns, output_array, batch_size=None, cache=None, kernels=None):
+    """ Sum of the squared errors of each compiled genotype, evaluated in batches of at most batch_size """
+    if cache is not None:
+        cache.bind(columns, variant=kernels_variant(kernels))
+    output_array = asarray(output_array, dtype=float64)
+    batch_size = max(1, min(len(programs), batch_size or len(programs)))
+
+    sums = empty(len(programs), dtype=float64)
+    observed_outputs = empty((batch_size, columns.shape[1]), dtype=float64)
+    for start in range(0, len(programs), batch_size):
+        batch = programs[start:start+batch_size]
+        for row, program in enumerate(batch):
+            execute_program(program, columns, out=observed_outputs[row], cache=cache, kernels=kernels)
+
+        # Reduce the squared errors in-place, along the rows of the matrix
+        squared_errors = observed_outputs[:len(batch)]
+        subtract(squared_errors, output_array, out=squared_errors)
+        square(squared_errors, out=squared_errors)
+        sums[start:start+len(batch)] = squared_errors.sum(axis=1)
+
+    return sums
+
+
+def fitness_from_squared_error_sums(sums, rows, fitness_function_name):
+    if fitness_function_name in MSE_NAMES:
+        return sums / rows
+    elif fitness_function_name in RMSE_NAMES:
+        return power(sums / rows, 1/2)
+    else:
+        raise TypeError('UNKNOWN FITNESS FUNCTION: {}'.format(fitness_function_name))
+
+
+def fitness_compiled_population(programs, columns, output_array, fitness_function_name, batch_size=None, cache=None,
+                                kernels=None):
+    """ Compute the fitness of a whole population of compiled genotypes over the (inputs x rows) columns at once """
+    if fitness_function_name not in MSE_NAMES | RMSE_NAMES:
+        raise TypeError('UNKNOWN FITNESS FUNCTION: {}'.format(fitness_function_name))
+    return fitness_from_squared_error_sums(
+        squared_error_sums(programs, columns, output_array, batch_size=batch_size, cache=cache, kernels=kernels),
+        columns.shape[1], fitness_function_name
+    )
+
+
+def fitness_decoded_population(decoded_population, input_array, output_array, fitness_function_name,
+                               batch_size=None, cache=None, fitness_cache=None, kernels=None):
+    """
+    Compute the fitness of a whole population of decoded genotypes. With a FitnessCache (see cache.py), only the
+    individuals never evaluated on this dataset are, once each.
+    """
+    columns = input_columns(input_array)
+    if fitness_cache is not None:
+        fitness_cache.bind(fitness_function_name, columns, asarray(output_array, dtype=float64),
+                           variant=kernels_variant(kernels))
+        return fitness_cache.fitness(
+            [genotype_key(decoded_genotype) for decoded_genotype in decoded_population],
+            lambda positions: fitness_compiled_population(
+                [compile_decoded_genotype(decoded_population[position]) for position in positions],
+                columns, output_array, fitness_function_name, batch_size=batch_size, cache=cache, kernels=kernels
+            )
+        )
+    return fitness_compiled_population(
+        [compile_decoded_genotype(decoded_genotype) for decoded_genotype in decoded_population],
+        columns, output_array, fitness_function_name, batch_size=batch_size, cache=cache, kernels=kernels
+    )
+
+
+def fitness_packed_population(genomes, input_array, output_array, fitness_function_name, batch_size=None, cache=None,
+                              fitness_cache=None, kernels=None):
+    """ Same as fitness_decoded_population, for a packed population (see genome.py) """
+    columns = input_columns(input_array)
+    if fitness_cache is not None:
+        fitness_cache.bind(fitness_function_name, columns, asarray(output_array, dtype=float64),
+                           variant=kernels_variant(kernels))
+        return fitness_cache.fitness(
+            [genome_key(genome) for genome in genomes],
+            lambda positions: fitness_compiled_population(
+                [compile_packed_genotype(genomes[position]['opcodes'], genomes[position]['constants'])
+                 for position in positions],
+                columns, output_array, fitness_function_name, batch_size=batch_size, cache=cache, kernels=kernels
+            )
+        )
+    return fitness_compiled_population(
+        [compile_packed_genotype(genome['opcodes'], genome['constants']) for genome in genomes],
+        columns, output_array, fitness_function_name, batch_size=batch_size, cache=cache, kernels=kernels
+    )
+
+
 # ======================================================================================================================
 # SELECTION
+
+
+ROULETTE_NAMES = {'ROULETTE', 'ROULETTE_SELECTION'}
+TOURNAMENT_NAMES = {'TOURNAMENT', 'TOURNAMENT_SELECTION'}
+
+
+def selection_groups(population_size, selection_size, group_size, rng):
+    """ Random groups of individuals. As in the legacy engine, no individual repeats inside a group """
+    group_size = min(group_size, population_size)
+    if group_size * group_size > population_size:
+        # Large groups: each group is the start of its own permutation, drawn by sorting random keys
+        return argsort(rng.random((selection_size, population_size)), axis=1)[:, :group_size]
+
+    # Small groups rarely have repeats, so the groups with repeats are simply drawn again
+    groups = rng.integers(population_size, size=(selection_size, group_size))
+    repeated = _repeated_rows(groups)
+    while repeated.any():
+        groups[repeated] = rng.integers(population_size, size=(count_nonzero(repeated), group_size))
+        repeated = _repeated_rows(groups)
+    return groups
+
+
+def _repeated_rows(groups):
+    groups = sort(groups, axis=1)
+    return (groups[:, 1:] == groups[:, :-1]).any(axis=1)
+
+
+def tournament_selection(fitness, selection_size, group_size, rng):
+
+    # The best fit (smaller error) of each group wins. Invalid individuals never win against valid ones
+    fitness = asarray(fitness, dtype=float64)
+    fitness = where(isfinite(fitness), fitness, inf)
+    groups = selection_groups(len(fitness), selection_size, group_size, rng)
+    return groups[arange(selection_size), argmin(fitness[groups], axis=1)]
+
+
+def roulette_selection(fitness, selection_size, group_size, rng):
+    """ Vectorized version of the legacy Environment.roulette_selection """
+    fitness = asarray(fitness, dtype=float64)
+    valid = isfinite(fitness)
+    fitness = where(valid, fitness, fitness[valid].max() if valid.any() else 0.0)
+    groups = selection_groups(len(fitness), selection_size, group_size, rng)
+    group_fitness = fitness[groups]
+
+    # Our fitness is an ERROR function, so the chance of each individual is proportional to the COMPLEMENT of its
+    # fitness in the range of its group
+    complemented_fitness = (group_fitness.max(axis=1, keepdims=True) + group_fitness.min(axis=1, keepdims=True)
+                            - group_fitness)
+    cumulative_fitness = complemented_fitness.cumsum(axis=1)
+    roulette_stops = rng.random((selection_size, 1)) * cumulative_fitness[:, -1:]
+    return groups[arange(selection_size), argmax(cumulative_fitness >= roulette_stops, axis=1)]
+
+
+def apply_selection(fitness, selection_function_name, selection_size, group_size, rng):
+    if selection_function_name in ROULETTE_NAMES:
+        selection_function = roulette_selection
+    elif selection_function_name in TOURNAMENT_NAMES:
+        selection_function = tournament_selection
+    else:
+        raise TypeError('UNKNOWN SELECTION FUNCTION: {}'.format(selection_function_name))
+    return selection_function(fitness, selection_size, group_size, rng)
+
+
+def elite_positions(fitness, elitism_size):
+    """ Positions of the elitism_size best fit individuals, from the best to the worst """
+    fitness = asarray(fitness, dtype=float64)
+    fitness = where(isfinite(fitness), fitness, inf)
+    elitism_size = min(elitism_size, len(fitness))
+    if elitism_size < 1:
+        return arange(0)
+    elite = argpartition(fitness, elitism_size-1)[:elitism_size]
+    return elite[argsort(fitness[elite], kind='stable')]
+
+
+# ======================================================================================================================
+# CROSSOVER
+
+
+REPRODUCTION_NAMES = {'RANDOM_REPRODUCTION', 'RANDOM', 'REPRODUCTION',
+                      'RANDOM_REPRODUCTION_CROSSOVER', 'RANDOM_CROSSOVER', 'REPRODUCTION_CROSSOVER'}
+SINGLE_POINT_NAMES = {'SINGLE_POINT', 'SINGLE_POINT_CROSSOVER'}
+UNIFORM_NAMES = {'UNIFORM', 'UNIFORM_CROSSOVER'}
+
+
+def random_reproduction_crossover(decoded_population, crossing_positions, target_population_size, rng,
+                                  return_parents=False):
+    # Decoded genotypes are immutable strings, so reproduction needs no copies
+    parents = rng.choice(crossing_positions, target_population_size)
+    children = [decoded_population[position] for position in parents]
+    return (children, parents) if return_parents else children
+
+
+def _parent_genes(decoded_population, parents) -> tuple:
+    """ The genes of each parent, by position, and their common number """
+    genes = {position: decoded_population[position].split(';') for position in set(parents.ravel().tolist())}
+    sizes = {len(parent_genes) for parent_genes in genes.values()}
+    if len(sizes) > 1:
+        raise ValueError('CROSSOVER REQUIRES INDIVIDUALS OF THE SAME SIZE, GOT {}'.format(sizes))
+    return genes, sizes.pop()
+
+
+def _cross(genes, parents, from_first, return_parents):
+    # Each child takes each gene from its first parent where from_first is set, and from the second elsewhere. Genes are
+    # drawn with the chances of their position (see operators.compile_grammar), so genes at the same position can
+    # always be swapped. Lineage follows the first parent
+    children = [
+        ';'.join([gene_a if first else gene_b for gene_a, gene_b, first in zip(genes[parent_a], genes[parent_b], mask)])
+        for parent_a, parent_b, mask in zip(parents[0].tolist(), parents[1].tolist(), from_first.tolist())
+    ]
+    return (children, parents[0]) if return_parents else children
+
+
+def single_point_crossover(decoded_population, crossing_positions, target_population_size, rng, return_parents=False):
+    """ Genes before a random point come from the first parent and the rest from the second """
+    parents = rng.choice(crossing_positions, (2, target_population_size))
+    genes, individual_size = _parent_genes(decoded_population, parents)
+    points = rng.integers(1, max(2, individual_size), (target_population_size, 1))
+    return _cross(genes, parents, arange(individual_size) < points, return_parents)
+
+
+def uniform_crossover(decoded_population, crossing_positions, target_population_size, rng, return_parents=False):
+    """ Each gene comes from either parent with the same probability """
+    parents = rng.choice(crossing_positions, (2, target_population_size))
+    genes, individual_size = _parent_genes(decoded_population, parents)
+    return _cross(genes, parents, rng.random((target_population_size, individual_size)) < 0.5, return_parents)
+
+
+def apply_crossover(decoded_population, crossing_positions, target_population_size, crossover_function_name, rng,
+                    return_parents=False):
+    """ With return_parents, also returns the position of the parent of each child in the decoded population """
+    if crossover_function_name in REPRODUCTION_NAMES:
+        crossover_function = random_reproduction_crossover
+    elif crossover_function_name in SINGLE_POINT_NAMES:
+        crossover_function = single_point_crossover
+    elif crossover_function_name in UNIFORM_NAMES:
+        crossover_function = uniform_crossover
+    else:
+        raise TypeError('UNKNOWN CROSSOVER FUNCTION: {}'.format(crossover_function_name))
+    return crossover_function(decoded_population, crossing_positions, target_population_size, rng, return_parents)
+
+
+# ======================================================================================================================
+# MUTATION
+
+
+def mutate_decoded_population(decoded_population, mutation_probability, rng, input_size=1,
+                              constant_mutation_factor_max=1.0):
+    mutations = rng.random(len(decoded_population)) < mutation_probability
+    return [
+        mutate_decoded_genotype(decoded_genotype, input_size, constant_mutation_factor_max, rng) if mutate
+        else decoded_genotype
+        for decoded_genotype, mutate in zip(decoded_population, mutations)
+    ]
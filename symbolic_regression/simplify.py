@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""simplify.py: Constant folding and removal of identity genes."""
+
+__license__     = "MIT"
+__author__      = "José Fonseca"
+__copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
+
+
+# ======================================================================================================================
+# IMPORTS
+
+
+import math
+
+import numpy as np
+
+from symbolic_regression import operators
+from symbolic_regression.genome import pack_decoded_genotype, unpack_genotype, stack_packed_genotypes
+
+
+# ======================================================================================================================
+# PAYLOAD
+# Gene i reads its arguments from positions i+1 and i+2, so a rewrite must keep the value of every position that is
+# still read by someone:
+# - Replacing gene i by a constant with its value changes no value at all, so constant subexpressions always fold.
+# - Removing genes shifts the rest of the genotype to the left. Gene i-1 reads positions i and i+1, and the value at
+#   i+1 changes, so genes are only removed when gene i-1 takes less than two arguments, or is never evaluated.
+# Genes that are never evaluated become the constant 0.0, and the ones after the last evaluated gene are dropped.
+# Simplified genotypes that compute the same expression in the same way are then equal, and hash the same.
+# With kernels, constants fold with the kernels. Kernels other than the operator kernels may clip their results (see
+# operators.PROTECTED_KERNELS), so an identity is then only removed when the argument that takes the place of the
+# gene is itself computed by a kernel, and is already clipped.
+
+
+_CONSTANT = operators.OPCODE_CONSTANT
+_PASS, _INVERSE, _MODULO = operators.OPCODES['PASS'], operators.OPCODES['INVERSE'], operators.OPCODES['MODULO']
+_ADD, _SUBTRACT = operators.OPCODES['ADD'], operators.OPCODES['SUBTRACT']
+_MULTIPLY, _DIVIDE = operators.OPCODES['MULTIPLY'], operators.OPCODES['DIVIDE']
+
+# Single-argument operators whose result is never negative (or NaN), so a MODULO over them does nothing
+_NON_NEGATIVE = {operators.OPCODES['SQUARE'], operators.OPCODES['SQRT'], _MODULO}
+
+# Two-argument operators with an identity element, as {opcode: (identity as first argument, as second argument)}
+_IDENTITIES = {_ADD: (0.0, 0.0), _SUBTRACT: (None, 0.0), _MULTIPLY: (1.0, 1.0), _DIVIDE: (None, 1.0)}
+
+
+def _reachable(opcodes) -> list:
+    """ Mask of the positions evaluated from the root """
+    reachable = [False] * len(opcodes)
+    pending = [0]
+    while pending:
+        position = pending.pop()
+        if (position < len(opcodes)) and not reachable[position]:
+            reachable[position] = True
+            pending.extend(range(position+1, position+1+operators.opcode_arity(opcodes[position])))
+    return reachable
+
+
+def _fold_constants(opcodes, constants, kernels=None):
+    """ Replace each outermost operator gene whose arguments are all constant by the constant it evaluates to """
+    values = [None] * (len(opcodes) + 2)
+    with np.errstate(all='ignore'):
+        for position in range(len(opcodes)-1, -1, -1):
+            opcode = opcodes[position]
+            arity = operators.opcode_arity(opcode)
+            if opcode == _CONSTANT:
+                values[position] = constants[position]
+            elif (0 < arity) and all(values[argument] is not None
+                                     for argument in range(position+1, position+1+arity)):
+                arguments = values[position+1:position+1+arity]
+                value = float((operators.OPERATOR_FUNCTIONS if kernels is None else kernels)[opcode](*arguments))
+                values[position] = value if math.isfinite(value) else None  # Invalid results are left to fitness
+
+    for position, reachable in enumerate(_reachable(opcodes)):
+        if reachable and (opcodes[position] != _CONSTANT) and (values[position] is not None):
+            opcodes[position], constants[position] = _CONSTANT, values[position]
+
+
+def _identity_genes(opcodes, constants, position, clipped=False) -> int:
+    """ Number of genes that can be removed at the position without changing its value (0, 1 or 2) """
+    removed = _identity_size(opcodes, constants, position)
+    survivor = position + removed
+    if removed and clipped and not (0 <= opcodes[survivor] < operators.OPCODE_INPUT):
+        return 0  # The gene clips the input or constant that would take its place
+    return removed
+
+
+def _identity_size(opcodes, constants, position) -> int:
+    opcode = opcodes[position]
+
+    def argument_is(offset, value):
+        argument = position + offset
+        return (argument < len(opcodes)) and (opcodes[argument] == _CONSTANT) and (constants[argument] == value)
+
+    if opcode == _PASS:
+        return 1
+    elif (opcode == _INVERSE) and (position+1 < len(opcodes)) and (opcodes[position+1] == _INVERSE):
+        return 2
+    elif (opcode == _MODULO) and (position+1 < len(opcodes)) and (opcodes[position+1] in _NON_NEGATIVE):
+        return 1
+    elif opcode in _IDENTITIES:
+        identity_a, identity_b = _IDENTITIES[opcode]
+        if (identity_b is not None) and argument_is(2, identity_b):
+            return 1  # The first argument, at position+1, takes the place of the gene
+        elif (identity_a is not None) and argument_is(1, identity_a):
+            return 2  # The second argument, at position+2, takes the place of the gene
+    return 0
+
+
+def _remove_identities(opcodes, constants, clipped=False) -> bool:
+    """ Remove the first removable identity gene found. Returns whether a gene was removed """
+    reachable = _reachable(opcodes)
+    for position in range(len(opcodes)):
+        if not reachable[position]:
+            continue
+        if (position > 0) and reachable[position-1] and (operators.opcode_arity(opcodes[position-1]) > 1):
+            continue
+        removed = _identity_genes(opcodes, constants, position, clipped)
+        if removed:
+            del opcodes[position:position+removed]
+            del constants[position:position+removed]
+            return True
+    return False
+
+
+def simplify_packed_genotype(opcodes, constants, individual_size=None, kernels=None) -> tuple:
+    """ Fold constants and remove identity genes. The result evaluates to the same values with the same kernels """
+    opcodes, constants = opcodes.tolist(), constants.tolist()
+    clipped = (kernels is not None) and (kernels is not operators.OPERATOR_KERNELS)
+    _fold_constants(opcodes, constants, kernels)
+    while _remove_identities(opcodes, constants, clipped):
+        _fold_constants(opcodes, constants, kernels)
+
+    reachable = _reachable(opcodes)
+    size = max(position for position, is_reachable in enumerate(reachable) if is_reachable) + 1
+    opcodes = [opcode if is_reachable else _CONSTANT for opcode, is_reachable in zip(opcodes[:size], reachable)]
+    constants = [constant if (is_reachable and (opcode == _CONSTANT)) else 0.0
+                 for opcode, constant, is_reachable in zip(opcodes, constants[:size], reachable)]
+    padding = [] if individual_size is None else [0.0] * max(0, individual_size - size)
+    return (np.asarray(opcodes + [_CONSTANT] * len(padding), dtype=np.int16),
+            np.asarray(constants + padding, dtype=np.float64))
+
+
+def simplify_decoded_genotype(decoded_genotype, kernels=None) -> str:
+    """ Same as simplify_packed_genotype, for a decoded genotype. Constants keep their exact (repr) value """
+    return unpack_genotype(*simplify_packed_genotype(*pack_decoded_genotype(decoded_genotype), kernels=kernels))
+
+
+def simplify_packed_population(genomes, kernels=None) -> np.ndarray:
+    """ Simplify each genome of a packed population, keeping the size of the population's genomes """
+    individual_size = genomes.dtype['opcodes'].shape[0]
+    return stack_packed_genotypes([
+        simplify_packed_genotype(genome['opcodes'], genome['constants'], individual_size, kernels)
+        for genome in genomes
+    ])
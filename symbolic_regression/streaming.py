@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""streaming.py: Fitness over datasets read in chunks, or over subsamples of their rows."""
+
+__license__     = "MIT"
+__author__      = "José Fonseca"
+__copyright__   = "Copyright (c) 2020 José F. R. Fonseca"
+
+
+# ======================================================================================================================
+# IMPORTS
+
+
+from itertools import islice
+
+import numpy as np
+
+from symbolic_regression.genotype import compile_decoded_genotype, input_columns
+from symbolic_regression.population import squared_error_sums, fitness_from_squared_error_sums, MSE_NAMES, \
+    RMSE_NAMES
+
+
+# ======================================================================================================================
+# CHUNK SOURCES
+# Each source yields (input_chunk, output_chunk) pairs of arrays, with the rows of the dataset in order
+
+
+def array_chunks(input_array, output_array, chunk_rows=65536):
+    """ Chunks of in-memory arrays or memory maps (np.load(..., mmap_mode='r')). Only one chunk is read at a time """
+    for start in range(0, len(output_array), chunk_rows):
+        yield np.asarray(input_array[start:start+chunk_rows]), np.asarray(output_array[start:start+chunk_rows])
+
+
+def csv_chunks(path, output_column=-1, chunk_rows=65536, delimiter=',', skip_header=0):
+    """ Chunks of a numeric CSV file. Every column but the output column is an input """
+    with open(path, 'r') as file:
+        for _ in range(skip_header):
+            next(file)
+        while True:
+            lines = list(islice(file, chunk_rows))
+            if not lines:
+                break
+            chunk = np.loadtxt(lines, delimiter=delimiter, dtype=np.float64, ndmin=2)
+            yield np.delete(chunk, output_column, axis=1), chunk[:, output_column]
+
+
+def parquet_chunks(path, output_column, input_names=None, chunk_rows=65536):
+    """ Chunks of a Parquet file, read by record batches. Requires pyarrow """
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    if input_names is None:
+        input_names = [name for name in parquet_file.schema_arrow.names if name != output_column]
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=list(input_names) + [output_column]):
+        yield (np.column_stack([batch.column(name).to_numpy(zero_copy_only=False) for name in input_names]),
+               batch.column(output_column).to_numpy(zero_copy_only=False))
+
+
+# ======================================================================================================================
+# FITNESS
+
+
+def fitness_decoded_population_stream(decoded_population, chunks, fitness_function_name, batch_size=None):
+    """
+    Same as population.fitness_decoded_population, consuming the dataset as a stream of (inputs, outputs) chunks.
+    The squared errors are accumulated chunk by chunk, so memory is bounded by the chunk size whatever the dataset size.
+    """
+    if fitness_function_name not in MSE_NAMES | RMSE_NAMES:
+        raise TypeError('UNKNOWN FITNESS FUNCTION: {}'.format(fitness_function_name))
+
+    programs = [compile_decoded_genotype(decoded_genotype) for decoded_genotype in decoded_population]
+    sums = np.zeros(len(programs), dtype=np.float64)
+    rows = 0
+    for input_chunk, output_chunk in chunks:
+        sums += squared_error_sums(programs, input_columns(input_chunk), output_chunk, batch_size=batch_size)
+        rows += len(output_chunk)
+
+    return fitness_from_squared_error_sums(sums, rows, fitness_function_name)
+
+
+# ======================================================================================================================
+# SUBSAMPLING
+
+
+def subsample_fraction(generation, generations, start_fraction=0.01, end_fraction=1.0):
+    """ Geometric schedule of the fraction of rows to use in each generation, from start_fraction to end_fraction """
+    progress = generation / max(1, generations - 1)
+    return min(1.0, start_fraction * (end_fraction / start_fraction) ** progress)
+
+
+def sample_rows(total_rows, fraction, rng):
+    """ Sorted positions of a random subset of the rows, so that memory maps are read in order """
+    return np.sort(rng.choice(total_rows, max(1, int(round(total_rows * fraction))), replace=False, shuffle=False))
+
+
+def sample_chunks(input_array, output_array, rows, chunk_rows=65536):
+    """ Same as array_chunks, over the given rows only. Only one chunk of them is copied at a time """
+    for start in range(0, len(rows), chunk_rows):
+        block = rows[start:start+chunk_rows]
+        yield np.asarray(input_array[block]), np.asarray(output_array[block])
+
+
+def fitness_decoded_population_subsample(decoded_population, input_array, output_array, fitness_function_name,
+                                         fraction, rng, refine=0.0, chunk_rows=65536, batch_size=None):
+    """
+    Rank the population on a random subset of the rows. Then, the best refine share of the population is evaluated
+    again on all the rows, streamed in chunks. The others keep the fitness estimated on the subset.
+    """
+    # The last generations of a schedule use all the rows, which are streamed without sampling them
+    if fraction >= 1.0:
+        return fitness_decoded_population_stream(
+            decoded_population, array_chunks(input_array, output_array, chunk_rows), fitness_function_name, batch_size
+        )
+
+    rows = sample_rows(len(output_array), fraction, rng)
+    fitness = fitness_decoded_population_stream(
+        decoded_population, sample_chunks(input_array, output_array, rows, chunk_rows), fitness_function_name,
+        batch_size
+    )
+
+    refined = int(round(len(decoded_population) * refine))
+    if (refined > 0) and (len(rows) < len(output_array)):
+        best = np.argsort(np.where(np.isfinite(fitness), fitness, np.inf), kind='stable')[:refined]
+        fitness[best] = fitness_decoded_population_stream(
+            [decoded_population[position] for position in best],
+            array_chunks(input_array, output_array, chunk_rows), fitness_function_name, batch_size
+        )
+    return fitness
@@ -0,0 +1,59 @@
+import os
+import sys
+import random
+import warnings
+import subprocess
+
+import numpy as np
+import pytest
+
+# The package is used from the root of the repository, without being installed
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from symbolic_regression.genotype import evaluate_decoded_genotype
+from symbolic_regression.population import create_decoded_population
+
+
+# Random genotypes of 12 genes over 2 inputs, followed by a few written to hit identities and invalid values
+GENERATED = 60
+
+
+@pytest.fixture(autouse=True)
+def ignore_floating_point_warnings():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        yield
+
+
+@pytest.fixture
+def dataset():
+    rng = np.random.default_rng(0)
+    input_array = rng.uniform(-3.0, 3.0, (40, 2))
+    return input_array, input_array[:, 0]**2 - input_array[:, 1]
+
+
+@pytest.fixture
+def population():
+    random.seed(0)
+    return create_decoded_population(GENERATED, 12, input_size=2) + [
+        'ADD;INPUT_0;<0.0>', 'MULTIPLY;PASS;<1.0>;INPUT_1', 'DIVIDE;INPUT_0;<0.0>',
+        'SQRT;SUBTRACT;<-1.5>;INPUT_0;<2.0>',
+    ]
+
+
+def scalar_outputs(decoded_genotype, input_array):
+    """ Outputs of the scalar evaluator, row by row. Every other evaluation path must compute the same """
+    return np.array([evaluate_decoded_genotype(decoded_genotype, *row) for row in input_array], dtype=np.float64)
+
+
+def assert_same(actual, expected):
+    np.testing.assert_allclose(actual, expected, rtol=1e-12, atol=0.0, equal_nan=True)
+
+
+def run_legacy(source):
+    """ Run the source with the legacy package, which shares its name with the new one, in its own interpreter """
+    result = subprocess.run([sys.executable, '-c', source], cwd=os.path.join(ROOT, 'deprecated'), capture_output=True,
+                            text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from symbolic_regression.binary import encode_binary_population, decode_binary_population, genomes_to_words, \
+    words_to_genomes, valid_words, apply_binary_crossover, bitflip_mutation
+from symbolic_regression.operators import OPCODE_INPUT
+from symbolic_regression.population import initialize_population
+
+from conftest import GENERATED
+
+
+def test_round_trip_with_many_inputs():
+    # The encoding keeps operators and inputs exactly, and constants to about 1e-6 relative
+    genomes = initialize_population(GENERATED, 12, 12, seed=0, packed=True)
+    genomes['opcodes'][0, -1], genomes['constants'][0, -1] = OPCODE_INPUT + 11, 0.0
+    decoded = words_to_genomes(genomes_to_words(genomes, 12), 12)
+    assert np.array_equal(decoded['opcodes'], genomes['opcodes'])
+    np.testing.assert_allclose(decoded['constants'], genomes['constants'], rtol=1e-6)
+    assert decode_binary_population(encode_binary_population(['ADD;INPUT_11;INPUT_3'], 12), 12) == [
+        'ADD;INPUT_11;INPUT_3'
+    ]
+
+
+def test_inputs_beyond_the_input_size_are_refused():
+    with pytest.raises(ValueError):
+        encode_binary_population(['ADD;INPUT_11;INPUT_3'])
+
+
+@pytest.mark.parametrize('crossover_function_name', ['RANDOM_REPRODUCTION', 'SINGLE_POINT', 'UNIFORM'])
+def test_children_take_each_word_from_a_parent(crossover_function_name):
+    words = encode_binary_population(initialize_population(GENERATED, 12, 12, seed=0), 12)
+    parents = np.arange(0, GENERATED, 2)
+    children = apply_binary_crossover(words, parents, 40, crossover_function_name, np.random.default_rng(0))
+    assert children.shape == (40, 12)
+    assert (children[:, None, :] == words[parents][None, :, :]).any(axis=1).all()
+
+
+def test_bitflip_keeps_words_valid():
+    words = encode_binary_population(initialize_population(GENERATED, 12, 12, seed=0), 12)
+    mutated = bitflip_mutation(words, 0.05, np.random.default_rng(0), input_size=12)
+    assert (mutated != words).any()
+    assert valid_words(mutated, input_size=12).all()
+    assert decode_binary_population(mutated, input_size=12)
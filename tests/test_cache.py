@@ -0,0 +1,54 @@
+import numpy as np
+
+from symbolic_regression.cache import SubtreeCache, FitnessCache
+from symbolic_regression.genotype import compile_decoded_genotype, suffix_keys, evaluate_compiled_genotype
+from symbolic_regression.population import fitness_decoded_population
+
+from conftest import scalar_outputs, assert_same
+
+
+def test_cached_matches_scalar(dataset, population):
+    # The cache is small enough to evict, and the population is evaluated twice to hit it
+    cache = SubtreeCache(max_bytes=64 * 40 * 8)
+    for decoded_genotype in population * 2:
+        assert_same(evaluate_compiled_genotype(compile_decoded_genotype(decoded_genotype), dataset[0], cache=cache),
+                    scalar_outputs(decoded_genotype, dataset[0]))
+    assert cache.hits > 0
+    assert cache.evictions > 0
+    assert cache.nbytes <= cache.max_bytes
+
+
+def test_suffix_keys_ignore_unreachable_genes():
+    first = suffix_keys(compile_decoded_genotype('ADD;INPUT_0;<1.0>;SIN;INPUT_0'))
+    second = suffix_keys(compile_decoded_genotype('ADD;INPUT_0;<1.0>;SQRT;<2.0>'))
+    assert first[:3] == second[:3]
+    assert first[3] != second[3]
+
+
+def test_aliased_columns_are_counted_once():
+    cache = SubtreeCache()
+    evaluate_compiled_genotype(compile_decoded_genotype('PASS;PASS;SIN;INPUT_0;INPUT_0'), np.linspace(-1.0, 1.0, 40),
+                               cache=cache)
+    assert len(cache) == 3
+    assert cache.nbytes == 40 * 8
+
+
+def test_cached_fitness_matches_fitness(dataset, population):
+    expected = fitness_decoded_population(population, *dataset, 'RMSE')
+    fitness_cache = FitnessCache()
+    assert_same(fitness_decoded_population(population + population[:10], *dataset, 'RMSE', batch_size=7,
+                                           cache=SubtreeCache(), fitness_cache=fitness_cache),
+                np.concatenate([expected, expected[:10]]))
+    assert (fitness_cache.misses, fitness_cache.duplicates) == (len(set(population)), 10)
+
+    # Copies made by later generations are never evaluated again
+    assert_same(fitness_decoded_population(population, *dataset, 'RMSE', fitness_cache=fitness_cache), expected)
+    assert fitness_cache.hits == len(population)
+
+
+def test_fitness_cache_is_cleared_for_other_datasets(dataset, population):
+    fitness_cache = FitnessCache()
+    fitness_decoded_population(population, *dataset, 'RMSE', fitness_cache=fitness_cache)
+    assert_same(fitness_decoded_population(population, dataset[0], -dataset[1], 'RMSE', fitness_cache=fitness_cache),
+                fitness_decoded_population(population, dataset[0], -dataset[1], 'RMSE'))
+    assert fitness_cache.hits == 0
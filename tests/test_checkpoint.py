@@ -0,0 +1,53 @@
+import warnings
+from itertools import islice
+
+import numpy as np
+import pytest
+
+from symbolic_regression.binary import encode_binary_population
+from symbolic_regression.checkpoint import evolve_binary_with_checkpoints, load_checkpoint
+from symbolic_regression.population import initialize_population
+
+
+GENERATIONS = 8
+CONFIGURATION = {'population_size': 30, 'individual_size': 10, 'seed': 7, 'bit_mutation_probability': 0.01}
+
+
+@pytest.fixture
+def dataset():
+    input_array = np.linspace(-1.0, 1.0, 50)
+    return input_array, input_array**2 + input_array
+
+
+def run(directory, dataset, stop=None, **configuration):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        generations = evolve_binary_with_checkpoints(str(directory), *dataset, GENERATIONS, **CONFIGURATION,
+                                                     **configuration)
+        return [(generation, np.array(words), np.array(fitness))
+                for generation, words, fitness in islice(generations, stop)]
+
+
+def assert_same_run(run_a, run_b):
+    assert [generation for generation, _, _ in run_a] == [generation for generation, _, _ in run_b]
+    for (_, words_a, fitness_a), (_, words_b, fitness_b) in zip(run_a, run_b):
+        assert np.array_equal(words_a, words_b)
+        assert np.array_equal(fitness_a, fitness_b, equal_nan=True)
+
+
+@pytest.mark.parametrize('stop', [1, 3, 5])
+def test_resume_matches_uninterrupted_run(tmp_path, dataset, stop):
+    uninterrupted = run(tmp_path / 'uninterrupted', dataset)
+    interrupted = run(tmp_path / 'interrupted', dataset, stop=stop)
+    assert load_checkpoint(str(tmp_path / 'interrupted')).generation == stop - 1
+
+    resumed = run(tmp_path / 'interrupted', dataset)
+    assert_same_run(interrupted + resumed, uninterrupted)
+
+
+def test_resume_with_starting_words(tmp_path, dataset):
+    words = encode_binary_population(initialize_population(30, 10, 1, seed=3))
+    uninterrupted = run(tmp_path / 'uninterrupted', dataset, words=words)
+    interrupted = run(tmp_path / 'interrupted', dataset, stop=4, words=words)
+    resumed = run(tmp_path / 'interrupted', dataset, words=words)
+    assert_same_run(interrupted + resumed, uninterrupted)
@@ -0,0 +1,38 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from symbolic_regression.distributed import DistributedFitness
+from symbolic_regression.genome import pack_decoded_population
+from symbolic_regression.population import create_decoded_population, fitness_decoded_population
+
+from conftest import GENERATED, assert_same
+
+
+def test_evaluation_without_workers_times_out():
+    with DistributedFitness('RMSE', worker_timeout=0.2) as distributed:
+        with pytest.raises(TimeoutError):
+            distributed.fitness(['INPUT_0'])
+        assert len(distributed.fitness([])) == 0
+
+
+def test_local_workers_match_local_fitness():
+    input_array = np.linspace(-1.0, 1.0, 30)
+    output_array = input_array**2
+    population = create_decoded_population(40, 10)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        expected = fitness_decoded_population(population, input_array, output_array, 'RMSE')
+    with DistributedFitness('RMSE', input_array=input_array, output_array=output_array, local_workers=2) as distributed:
+        assert np.array_equal(distributed.fitness(population), expected, equal_nan=True)
+
+
+@pytest.mark.parametrize('packed', [False, True])
+def test_local_workers_match_local_fitness_exactly(dataset, population, packed):
+    # Constants equal to small integers have the same encoding as operators, and must reach the workers as they are
+    population = population[:GENERATED] + ['ADD;INPUT_0;<0.0>;PASS;INPUT_1;<1.0>;INPUT_0;<2.0>;SIN;<3.0>;<4.0>;<5.0>']
+    expected = fitness_decoded_population(population, *dataset, 'RMSE')
+    with DistributedFitness('RMSE', input_array=dataset[0], output_array=dataset[1], local_workers=1,
+                            packed=packed) as distributed:
+        assert_same(distributed.fitness(pack_decoded_population(population) if packed else population), expected)
@@ -0,0 +1,9 @@
+from symbolic_regression.genotype import compile_decoded_genotype, evaluate_compiled_genotype
+
+from conftest import scalar_outputs, assert_same
+
+
+def test_compiled_matches_scalar(dataset, population):
+    for decoded_genotype in population:
+        assert_same(evaluate_compiled_genotype(compile_decoded_genotype(decoded_genotype), dataset[0]),
+                    scalar_outputs(decoded_genotype, dataset[0]))
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from symbolic_regression.genome import pack_decoded_genotype, unpack_genotype, pack_decoded_population, \
+    unpack_population
+from symbolic_regression.population import fitness_decoded_population, fitness_packed_population
+
+from conftest import GENERATED, assert_same
+
+
+def test_packed_genotypes_round_trip(population):
+    for decoded_genotype in population:
+        assert unpack_genotype(*pack_decoded_genotype(decoded_genotype)) == decoded_genotype
+
+
+def test_packed_populations_round_trip(population):
+    genomes = pack_decoded_population(population[:GENERATED])
+    assert genomes['opcodes'].dtype == np.int16
+    assert unpack_population(genomes) == population[:GENERATED]
+
+
+def test_packed_populations_require_a_single_size(population):
+    with pytest.raises(ValueError):
+        pack_decoded_population(population)
+
+
+@pytest.mark.parametrize('fitness_function', ['MSE', 'RMSE'])
+def test_packed_fitness_matches_decoded_fitness(dataset, population, fitness_function):
+    # Packed individuals all have the same size, so only the generated ones are packed
+    assert_same(fitness_packed_population(pack_decoded_population(population[:GENERATED]), *dataset, fitness_function),
+                fitness_decoded_population(population[:GENERATED], *dataset, fitness_function))
@@ -0,0 +1,63 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from symbolic_regression.operators import GRAMMAR, GRAMMAR_FAMILIES, GRAMMAR_OPCODES, OPCODE_CONSTANT, OPCODE_INPUT, \
+    OPERATORS, compile_grammar, grammar_cumulative, sample_grammar_opcodes
+
+
+SIZES = [1, 2, 3, 5, 6, 12]
+
+
+def grammar_chances(individual_size):
+    """ The chance of each gene at each position, read from the GRAMMAR string """
+    chances = []
+    for level in GRAMMAR(individual_size).split(';'):
+        families = level.split('|')
+        position = {}
+        for family in families:
+            for member in GRAMMAR_FAMILIES[family]:
+                position[member] = position.get(member, 0) + Fraction(1, len(families) * len(GRAMMAR_FAMILIES[family]))
+        chances.append(position)
+    return chances
+
+
+@pytest.mark.parametrize('individual_size', SIZES)
+def test_compiled_grammar_matches_the_grammar(individual_size):
+    grammar = compile_grammar(individual_size)
+    assert grammar.shape == (max(1, individual_size), len(GRAMMAR_OPCODES))
+    assert not grammar.flags.writeable
+    assert compile_grammar(individual_size) is grammar
+    np.testing.assert_allclose(grammar.sum(axis=1), 1.0, rtol=1e-12)
+
+    names = OPERATORS + ['INPUT', 'CONSTANT']
+    for position, chances in enumerate(grammar_chances(individual_size)):
+        expected = [float(chances.get(name, 0)) for name in names]
+        np.testing.assert_allclose(grammar[position], expected, rtol=1e-12, atol=0.0)
+
+
+@pytest.mark.parametrize('individual_size', SIZES)
+def test_cumulative_weights_match_the_compiled_grammar(individual_size):
+    cumulative = np.asarray(grammar_cumulative(individual_size), dtype=np.float64)
+    assert np.all(np.diff(cumulative, axis=1) >= 0)
+    np.testing.assert_allclose(np.diff(cumulative, axis=1, prepend=0.0) / cumulative[:, -1:],
+                               compile_grammar(individual_size), rtol=1e-12)
+
+
+@pytest.mark.parametrize('individual_size', [3, 8])
+def test_sampled_opcodes_follow_the_grammar(individual_size):
+    count, input_size = 20000, 3
+    opcodes = sample_grammar_opcodes(count, individual_size, input_size, np.random.default_rng(0))
+    assert opcodes.shape == (count, individual_size)
+    assert opcodes.dtype == np.int16
+
+    # Inputs are spread over the input size, and count as one opcode for the grammar
+    assert set(np.unique(opcodes[opcodes >= OPCODE_INPUT]).tolist()) == set(range(OPCODE_INPUT, OPCODE_INPUT + 3))
+    columns = np.where(opcodes == OPCODE_CONSTANT, len(GRAMMAR_OPCODES) - 1, np.minimum(opcodes, OPCODE_INPUT))
+
+    grammar = compile_grammar(individual_size)
+    for position in range(individual_size):
+        frequencies = np.bincount(columns[:, position], minlength=len(GRAMMAR_OPCODES)) / count
+        assert np.all(frequencies[grammar[position] == 0] == 0)
+        np.testing.assert_allclose(frequencies, grammar[position], atol=0.015)
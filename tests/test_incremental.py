@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from symbolic_regression.operators import PROTECTED_KERNELS
+from symbolic_regression.engine import evolve
+from symbolic_regression.population import fitness_decoded_population, apply_crossover, mutate_decoded_population
+from symbolic_regression.incremental import IncrementalFitness
+
+from conftest import assert_same
+
+
+@pytest.mark.parametrize('kernels', [None, PROTECTED_KERNELS])
+def test_incremental_matches_full_evaluation(dataset, population, kernels):
+    incremental = IncrementalFitness(*dataset, 'RMSE', kernels=kernels)
+    rng = np.random.default_rng(1)
+    fitness = incremental(population)
+    for _ in range(3):
+        assert_same(fitness, fitness_decoded_population(population, *dataset, 'RMSE', kernels=kernels))
+        children, parents = apply_crossover(population, np.arange(len(population)), len(population),
+                                            'RANDOM_REPRODUCTION', rng, return_parents=True)
+        population = mutate_decoded_population(children, 0.5, rng, input_size=2)
+        fitness = incremental(population, parents)
+    assert incremental.reused > 0
+
+
+def test_unchanged_copies_compute_nothing(dataset, population):
+    incremental = IncrementalFitness(*dataset, 'RMSE')
+    fitness = incremental(population)
+    computed = incremental.computed
+    assert_same(incremental(population, np.arange(len(population))), fitness)
+    assert incremental.computed == computed
+
+
+def test_children_of_parents_beyond_max_bytes_are_evaluated_in_full(dataset, population):
+    incremental = IncrementalFitness(*dataset, 'RMSE', max_bytes=0)
+    incremental(population)
+    assert_same(incremental(population, np.arange(len(population))),
+                fitness_decoded_population(population, *dataset, 'RMSE'))
+    assert incremental.reused == 0
+
+
+@pytest.mark.parametrize('option', [{'simplify': True}, {'batch_size': 8}, {'fitness': len}])
+def test_incremental_evolution_refuses_options_it_would_ignore(dataset, option):
+    with pytest.raises(ValueError):
+        evolve(*dataset, 3, population_size=10, incremental=True, **option)
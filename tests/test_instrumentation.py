@@ -0,0 +1,57 @@
+import csv
+import json
+
+from symbolic_regression.instrumentation import Instrumentation, CsvSink
+
+from conftest import run_legacy
+
+
+def test_csv_sink_adds_the_columns_of_later_records(tmp_path):
+    path = tmp_path / 'records.csv'
+    with CsvSink(path) as sink:
+        instrumentation = Instrumentation([sink])
+        instrumentation.end_generation(0)
+        instrumentation.count('repairs', 3)
+        instrumentation.end_generation(1)
+    with CsvSink(path) as sink:
+        sink({'generation': 2, 'extra': 'x'})
+
+    with open(path, newline='') as file:
+        rows = list(csv.DictReader(file))
+    assert [row['generation'] for row in rows] == ['0', '1', '2']
+    assert [row['repairs'] for row in rows] == ['', '3', '']
+    assert [row['extra'] for row in rows] == ['', '', 'x']
+
+
+_LEGACY_GENERATIONS = '''
+import json
+import random
+import warnings
+from contextlib import nullcontext
+import numpy as np
+from symbolic_regression import Environment
+
+class Recorder(object):
+    def __init__(self): self.generations = []
+    def phase(self, name): return nullcontext()
+    def end_generation(self, generation, **values): self.generations.append(generation)
+
+warnings.simplefilter('ignore', RuntimeWarning)
+random.seed(0)
+np.random.seed(0)
+recorder = Recorder()
+environment = Environment({
+    'population_size': 10, 'individual_size': 8, 'numerical_value_max': 10, 'targets_max': 3,
+    'fitness_function': 'RMSE', 'selection_function': 'TOURNAMENT', 'selection_group_size': 3,
+    'selection_population_size': 10, 'elitism_size': 2, 'crossover_function': 'RANDOM_REPRODUCTION',
+    'mutation_target_probability': 0.3, 'mutation_type_probability': 0.3, 'mutation_constants_factor_max': 2.0,
+}, instrumentation=recorder)
+inputs = list(np.linspace(-1.0, 1.0, 10))
+for inplace in [False, False, True, False]:
+    environment.epoch(inputs, inputs, inplace=inplace)
+print(json.dumps(recorder.generations))
+'''
+
+
+def test_legacy_epochs_report_their_generation():
+    assert json.loads(run_legacy(_LEGACY_GENERATIONS)) == [0, 1, 2, 3]
@@ -0,0 +1,29 @@
+import numpy as np
+
+from symbolic_regression.islands import evolve_islands, migration_targets
+from symbolic_regression.genotype import compile_decoded_genotype
+from symbolic_regression.population import fitness_decoded_population
+
+from conftest import assert_same
+
+
+def test_migration_targets():
+    assert migration_targets('RING', 3) == [[1], [2], [0]]
+    assert migration_targets('FULLY_CONNECTED', 3) == [[1, 2], [0, 2], [0, 1]]
+
+
+def test_islands_keep_their_fitness_across_migrations(dataset):
+    # Migrations happen at generations 1 to 4, so most individuals have been through one
+    configuration = dict(islands=3, topology='FULLY_CONNECTED', migration_interval=1, migration_size=4,
+                         population_size=20, individual_size=8, seed=0)
+    results = evolve_islands(*dataset, 6, **configuration)
+    assert len(results) == 3
+    for population, fitness in results:
+        assert len(population) == 20
+        for decoded_genotype in population:
+            compile_decoded_genotype(decoded_genotype)
+        assert_same(fitness, fitness_decoded_population(population, *dataset, 'RMSE'))
+
+    # Migrants are received in the order of their source, so the run is reproducible from its seed
+    again = evolve_islands(*dataset, 6, **configuration)
+    assert [population for population, _ in again] == [population for population, _ in results]
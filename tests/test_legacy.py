@@ -0,0 +1,114 @@
+from conftest import run_legacy
+
+
+_VECTORIZED_OUTPUTS = '''
+import random
+import warnings
+import numpy as np
+from symbolic_regression import Environment
+
+warnings.simplefilter('ignore', RuntimeWarning)
+random.seed(0)
+np.random.seed(0)
+environment = Environment({
+    'population_size': 30, 'individual_size': 12, 'numerical_value_max': 10, 'targets_max': 3,
+    'fitness_function': 'RMSE', 'selection_function': 'TOURNAMENT', 'selection_group_size': 3,
+    'selection_population_size': 30, 'elitism_size': 2, 'crossover_function': 'RANDOM_REPRODUCTION',
+    'mutation_target_probability': 0.3, 'mutation_type_probability': 0.3, 'mutation_constants_factor_max': 2.0,
+})
+inputs = list(np.linspace(-1.0, 1.0, 20))
+outputs = [2.0 * value + 1.0 for value in inputs]
+for _ in range(5):
+    for individual in environment.population:
+        expected = np.array([individual.output(value) for value in inputs], dtype=np.float64)
+        assert np.array_equal(individual.outputs(inputs), expected, equal_nan=True), individual.print()
+    environment.epoch(inputs, outputs, inplace=True)
+'''
+
+
+def test_vectorized_outputs_match_scalar_output():
+    run_legacy(_VECTORIZED_OUTPUTS)
+
+
+_REPAIR = '''
+import random
+import numpy as np
+from symbolic_regression import Environment
+from symbolic_regression.node import Empty
+
+random.seed(0)
+np.random.seed(0)
+environment = Environment({
+    'population_size': 200, 'individual_size': 6, 'numerical_value_max': 10, 'targets_max': 3,
+    'fitness_function': 'RMSE', 'selection_function': 'TOURNAMENT', 'selection_group_size': 3,
+    'selection_population_size': 200, 'elitism_size': 2, 'crossover_function': 'RANDOM_REPRODUCTION',
+    'mutation_target_probability': 0.5, 'mutation_type_probability': 0.5, 'mutation_constants_factor_max': 2.0,
+})
+for individual in environment.population:
+    assert individual.is_valid(), individual.print()
+    assert individual.repair() == 0
+    for _ in range(5):
+        individual.mutate_type()
+        individual.mutate_target()
+        assert individual.is_valid(), individual.print()
+
+# Each change is counted: the root, the empty genes it reaches, and the input it needs
+for individual in environment.population:
+    for position in range(environment.individual_size):
+        individual[position] = Empty(individual, position)
+    attempts = individual.validity_attempts
+    changed = individual.repair()
+    assert individual.is_valid(), individual.print()
+    changed_positions = sum([not isinstance(gene, Empty) for gene in individual])
+    assert changed_positions <= changed <= changed_positions + 1
+    assert individual.validity_attempts == attempts + changed
+    assert individual.repair() == 0
+'''
+
+
+def test_repair_makes_individuals_valid():
+    run_legacy(_REPAIR)
+
+
+_COPY_ON_WRITE = '''
+import random
+import numpy as np
+from symbolic_regression import Environment
+from symbolic_regression.node import Input
+
+random.seed(0)
+np.random.seed(0)
+environment = Environment({
+    'population_size': 50, 'individual_size': 8, 'numerical_value_max': 10, 'targets_max': 3,
+    'fitness_function': 'RMSE', 'selection_function': 'TOURNAMENT', 'selection_group_size': 3,
+    'selection_population_size': 50, 'elitism_size': 2, 'crossover_function': 'RANDOM_REPRODUCTION',
+    'mutation_target_probability': 1.0, 'mutation_type_probability': 0.5, 'mutation_constants_factor_max': 2.0,
+})
+inputs = np.linspace(-1.0, 1.0, 10)
+for individual in environment.population:
+    genes, printed, outputs = list(individual), individual.print(), individual.outputs(inputs)
+
+    # A copy shares the chromosome, and computes the same
+    copy = individual.copy()
+    assert copy._chromossome is individual._chromossome
+    assert np.array_equal(copy.outputs(inputs), outputs, equal_nan=True)
+
+    # Writing to either of them leaves the other alone
+    copy[0] = Input(copy, 0)
+    copy.mutate_target()
+    assert copy._chromossome is not individual._chromossome
+    assert all([a is b for a, b in zip(individual, genes)])
+    assert individual.print() == printed
+    assert np.array_equal(individual.outputs(inputs), outputs, equal_nan=True)
+
+    # Mutated genes are copies, and the original genes keep their targets and values
+    for gene in genes:
+        targets, value = list(gene._targets), gene._value
+        mutated = gene.mutated()
+        assert (gene._targets, gene._value) == (targets, value)
+        assert (mutated is gene) == ((mutated._targets, mutated._value) == (targets, value))
+'''
+
+
+def test_copies_share_the_chromosome_until_written():
+    run_legacy(_COPY_ON_WRITE)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from symbolic_regression import MIN_VALUE, MAX_VALUE
+from symbolic_regression.operators import OPERATORS, OPERATOR_FUNCTIONS, OPERATOR_ARITY, OPERATOR_KERNELS, \
+    PROTECTED_KERNELS, encode_value, decode_value, encode_values, decode_values, encode_genotype, decode_genotype, \
+    encode_genotypes_to_words, decode_genotypes_from_words, words_to_bits
+from symbolic_regression.genotype import compile_decoded_genotype, input_columns, execute_program
+
+from conftest import scalar_outputs, assert_same
+
+
+ARGUMENTS = np.array([-1e300, -3.5, -1.0, -0.25, 0.0, 0.25, 1.0, 3.5, 1e300])
+
+
+def test_operator_kernels_match_scalar(dataset, population):
+    columns = input_columns(dataset[0])
+    for decoded_genotype in population:
+        assert_same(execute_program(compile_decoded_genotype(decoded_genotype), columns, kernels=OPERATOR_KERNELS),
+                    scalar_outputs(decoded_genotype, dataset[0]))
+
+
+@pytest.mark.parametrize('opcode', range(len(OPERATORS)))
+def test_protected_kernels_clip_the_operators(opcode):
+    arguments = np.meshgrid(*[ARGUMENTS] * OPERATOR_ARITY[opcode])
+    with np.errstate(all='ignore'):
+        protected = PROTECTED_KERNELS[opcode](*arguments)
+        if OPERATORS[opcode] == 'SQRT':
+            arguments = [np.abs(arguments[0])]
+        expected = np.clip(OPERATOR_FUNCTIONS[opcode](*arguments), MIN_VALUE, MAX_VALUE)
+    assert_same(protected, expected)
+    assert np.isfinite(protected).all()
+
+
+def test_protected_kernels_leave_their_arguments_alone():
+    arguments = ARGUMENTS.copy()
+    PROTECTED_KERNELS[OPERATORS.index('PASS')](arguments)
+    assert np.array_equal(arguments, ARGUMENTS)
+
+
+def test_protected_outputs_are_finite(dataset, population):
+    columns = input_columns(dataset[0])
+    for decoded_genotype in population:
+        assert np.isfinite(execute_program(compile_decoded_genotype(decoded_genotype), columns,
+                                           kernels=PROTECTED_KERNELS)).all()
+
+
+def test_vectorized_encoding_matches_scalar(population):
+    words = encode_genotypes_to_words(population)
+    assert [words_to_bits(genotype_words) for genotype_words in words] == \
+        [encode_genotype(decoded_genotype) for decoded_genotype in population]
+    assert decode_genotypes_from_words(words) == \
+        [decode_genotype(encode_genotype(decoded_genotype)) for decoded_genotype in population]
+
+
+def test_vectorized_values_match_scalar():
+    values = np.concatenate([np.random.default_rng(0).uniform(-1e6, 1e6, 100), ARGUMENTS[1:-1]])
+    words = encode_values(values)
+    assert [words_to_bits(np.array([word])) for word in words] == [encode_value(value) for value in values.tolist()]
+    assert decode_values(words).tolist() == [decode_value(encode_value(value)) for value in values.tolist()]
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from symbolic_regression import operators
+from symbolic_regression.genome import pack_decoded_genotype
+from symbolic_regression.genotype import compile_packed_genotype, input_columns, execute_program
+from symbolic_regression.optimization import differentiate_program, optimize_constants
+
+from conftest import assert_same
+
+
+@pytest.mark.parametrize('decoded_genotype', [
+    'ADD;MULTIPLY;<0.7>;INVERSE;SIN;INPUT_0;<0.2>',
+    'DIVIDE;SQUARE;<1.3>;ADD;INPUT_1;<0.4>;INPUT_0',
+    'SUBTRACT;CUBE;MULTIPLY;INPUT_0;<0.6>;<1.1>;INPUT_1',
+    'MULTIPLY;COSIN;TANGENT;ADD;<0.05>;MULTIPLY;<0.02>;INPUT_1;INPUT_0',
+])
+def test_jacobian_matches_finite_differences(dataset, decoded_genotype):
+    opcodes, constants = pack_decoded_genotype(decoded_genotype)
+    program = compile_packed_genotype(opcodes, constants)
+    parameters = [position for position in program[2].tolist() if opcodes[position] == operators.OPCODE_CONSTANT]
+    columns = input_columns(dataset[0])
+    outputs, jacobian = differentiate_program(program, columns, parameters)
+    assert_same(outputs, execute_program(program, columns))
+    assert jacobian.shape == (len(parameters), len(dataset[1]))
+
+    for row, parameter in enumerate(parameters):
+        step = 1e-6 * max(1.0, abs(constants[parameter]))
+        shifted = [constants.copy(), constants.copy()]
+        shifted[0][parameter] += step
+        shifted[1][parameter] -= step
+        plus, minus = [execute_program((opcodes, values, program[2]), columns) for values in shifted]
+        np.testing.assert_allclose(jacobian[row], (plus - minus) / (2.0 * step), rtol=1e-5, atol=1e-6)
+
+
+def test_fitting_recovers_known_constants():
+    input_array = np.linspace(-2.0, 2.0, 50)
+    output_array = 0.5 + 2.0 * np.sin(0.1 * np.pi * 2.0 * input_array)
+    fitted = optimize_constants('ADD;<0.2>;MULTIPLY;<1.5>;SIN;MULTIPLY;<0.08>;INPUT_0', input_array, output_array,
+                                iterations=50)
+    np.testing.assert_allclose(pack_decoded_genotype(fitted)[1][[1, 3, 6]], [0.5, 2.0, 0.1], rtol=1e-6)
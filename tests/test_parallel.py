@@ -0,0 +1,20 @@
+import pytest
+
+from symbolic_regression.genome import pack_decoded_population
+from symbolic_regression.operators import PROTECTED_KERNELS
+from symbolic_regression.parallel import FitnessPool
+from symbolic_regression.population import fitness_decoded_population
+
+from conftest import GENERATED, assert_same
+
+
+@pytest.mark.parametrize('packed', [False, True])
+@pytest.mark.parametrize('kernels', [None, PROTECTED_KERNELS])
+def test_pool_matches_local_fitness(dataset, population, packed, kernels):
+    # Constants equal to small integers have the same encoding as operators, and must reach the workers as they are
+    population = population[:GENERATED] + ['ADD;INPUT_0;<0.0>;PASS;INPUT_1;<1.0>;INPUT_0;<2.0>;SIN;<3.0>;<4.0>;<5.0>']
+    expected = fitness_decoded_population(population, *dataset, 'RMSE', kernels=kernels)
+    with FitnessPool(*dataset, 'RMSE', processes=2, kernels=kernels) as pool:
+        assert_same(pool.fitness(pack_decoded_population(population) if packed else population, packed=packed),
+                    expected)
+        assert len(pool.fitness([], packed=packed)) == 0
@@ -0,0 +1,87 @@
+import random
+import warnings
+
+import numpy as np
+import pytest
+
+from symbolic_regression.engine import evolve
+from symbolic_regression.genome import unpack_population
+from symbolic_regression.genotype import compile_decoded_genotype
+from symbolic_regression.population import selection_groups, reduce_fitness, fitness_decoded_population, \
+    apply_crossover, initialize_population, spawn_generators
+
+from conftest import GENERATED, scalar_outputs, assert_same
+
+
+@pytest.mark.parametrize('fitness_function', ['MSE', 'RMSE'])
+@pytest.mark.parametrize('batch_size', [None, 1, 7])
+def test_batched_fitness_matches_scalar(dataset, population, fitness_function, batch_size):
+    expected = [reduce_fitness(scalar_outputs(decoded_genotype, dataset[0]), dataset[1], fitness_function)
+                for decoded_genotype in population]
+    assert_same(fitness_decoded_population(population, *dataset, fitness_function, batch_size=batch_size), expected)
+
+
+@pytest.mark.parametrize('population_size, selection_size, group_size', [
+    (100, 50, 3), (10, 20, 4), (10, 5, 10), (5, 50, 8),
+])
+def test_selection_groups_have_no_repeats(population_size, selection_size, group_size):
+    groups = selection_groups(population_size, selection_size, group_size, np.random.default_rng(0))
+    assert groups.shape == (selection_size, min(group_size, population_size))
+    assert all(len(set(group)) == len(group) for group in groups.tolist())
+
+
+def test_seed_leaves_random_module_alone():
+    input_array = np.linspace(-1.0, 1.0, 50)
+    state = random.getstate()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        first = [fitness for _, _, fitness in evolve(input_array, input_array**2, 5, population_size=30, seed=3)]
+        assert random.getstate() == state
+        random.random()
+        second = [fitness for _, _, fitness in evolve(input_array, input_array**2, 5, population_size=30, seed=3)]
+    assert all(np.array_equal(a, b, equal_nan=True) for a, b in zip(first, second))
+
+
+@pytest.mark.parametrize('crossover_function_name', ['SINGLE_POINT', 'UNIFORM'])
+def test_children_take_each_gene_from_a_parent(dataset, population, crossover_function_name):
+    population = population[:GENERATED]
+    crossing_positions = np.arange(0, GENERATED, 2)
+    children, parents = apply_crossover(population, crossing_positions, 40, crossover_function_name,
+                                        np.random.default_rng(0), return_parents=True)
+    assert len(children) == 40
+    assert set(parents.tolist()) <= set(crossing_positions.tolist())
+    genes = np.array([decoded_genotype.split(';') for decoded_genotype in population])
+    for child in children:
+        assert (np.array(child.split(';'))[None, :] == genes[crossing_positions]).any(axis=0).all()
+    fitness_decoded_population(children, *dataset, 'RMSE')
+
+
+def test_crossover_of_different_sizes_is_refused():
+    with pytest.raises(ValueError):
+        apply_crossover(['INPUT_0', 'SIN;INPUT_0'], np.arange(2), 10, 'UNIFORM', np.random.default_rng(0))
+
+
+def test_same_seed_gives_the_same_population():
+    state = random.getstate()
+    first = initialize_population(GENERATED, 12, 3, seed=5)
+    assert initialize_population(GENERATED, 12, 3, seed=5) == first
+    assert initialize_population(GENERATED, 12, 3, seed=6) != first
+    assert unpack_population(initialize_population(GENERATED, 12, 3, seed=5, packed=True)) == first
+    assert random.getstate() == state
+    for decoded_genotype in first:
+        compile_decoded_genotype(decoded_genotype)
+
+
+def test_generators_are_used_as_they_are():
+    rng = np.random.default_rng(5)
+    first = initialize_population(GENERATED, 12, 3, seed=rng)
+    assert first == initialize_population(GENERATED, 12, 3, seed=5)
+    assert initialize_population(GENERATED, 12, 3, seed=rng) != first
+
+
+def test_each_stream_draws_its_slice_alone():
+    genomes = initialize_population(100, 12, 3, seed=5, packed=True, streams=3)
+    assert len(genomes) == 100
+    assert np.array_equal(genomes, initialize_population(100, 12, 3, seed=5, packed=True, streams=3))
+    for (start, end), rng in zip([(0, 33), (33, 66), (66, 100)], spawn_generators(5, 3)):
+        assert np.array_equal(genomes[start:end], initialize_population(end - start, 12, 3, seed=rng, packed=True))
@@ -0,0 +1,35 @@
+import pytest
+
+from symbolic_regression.operators import PROTECTED_KERNELS
+from symbolic_regression.genome import pack_decoded_population
+from symbolic_regression.genotype import compile_decoded_genotype, input_columns, execute_program
+from symbolic_regression.simplify import simplify_decoded_genotype, simplify_packed_population
+
+from conftest import GENERATED, scalar_outputs, assert_same
+
+
+def test_simplified_matches_scalar(dataset, population):
+    for decoded_genotype in population:
+        assert_same(scalar_outputs(simplify_decoded_genotype(decoded_genotype), dataset[0]),
+                    scalar_outputs(decoded_genotype, dataset[0]))
+
+
+def test_simplified_matches_protected_kernels(dataset, population):
+    columns = input_columns(dataset[0])
+    for decoded_genotype in population:
+        simplified = simplify_decoded_genotype(decoded_genotype, kernels=PROTECTED_KERNELS)
+        assert_same(execute_program(compile_decoded_genotype(simplified), columns, kernels=PROTECTED_KERNELS),
+                    execute_program(compile_decoded_genotype(decoded_genotype), columns, kernels=PROTECTED_KERNELS))
+
+
+@pytest.mark.parametrize('decoded_genotype, simplified', [
+    ('ADD;INPUT_0;<0.0>', 'INPUT_0'), ('MULTIPLY;INPUT_1;<1.0>', 'INPUT_1'), ('PASS;SIN;INPUT_0', 'SIN;INPUT_0'),
+    ('INVERSE;INVERSE;INPUT_0', 'INPUT_0'), ('ADD;<1.0>;<2.0>', '<3.0>'),
+])
+def test_simplify_removes_identities_and_folds_constants(decoded_genotype, simplified):
+    assert simplify_decoded_genotype(decoded_genotype) == simplified
+
+
+def test_simplified_populations_keep_their_size(population):
+    genomes = simplify_packed_population(pack_decoded_population(population[:GENERATED]))
+    assert genomes['opcodes'].shape == (GENERATED, 12)
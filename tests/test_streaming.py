@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from symbolic_regression.population import fitness_decoded_population
+from symbolic_regression.streaming import array_chunks, fitness_decoded_population_stream, subsample_fraction, \
+    sample_rows, fitness_decoded_population_subsample
+
+from conftest import assert_same
+
+
+def test_fraction_schedule_is_geometric():
+    fractions = [subsample_fraction(generation, 5, 0.01, 1.0) for generation in range(5)]
+    assert_same(fractions, [0.01, 0.01**0.75, 0.1, 0.01**0.25, 1.0])
+    assert subsample_fraction(0, 1, 0.5, 1.0) == 0.5
+    assert subsample_fraction(9, 10, 0.1, 2.0) == 1.0
+
+
+def test_stream_matches_fitness(dataset, population):
+    assert_same(fitness_decoded_population_stream(population, array_chunks(*dataset, chunk_rows=7), 'RMSE'),
+                fitness_decoded_population(population, *dataset, 'RMSE'))
+
+
+@pytest.mark.parametrize('fraction', [0.25, 0.5])
+def test_subsample_matches_fitness_on_its_rows(dataset, population, fraction):
+    rows = sample_rows(len(dataset[1]), fraction, np.random.default_rng(1))
+    assert len(rows) == round(len(dataset[1]) * fraction)
+    assert np.all(np.diff(rows) > 0)
+    assert_same(fitness_decoded_population_subsample(population, *dataset, 'MSE', fraction, np.random.default_rng(1),
+                                                     chunk_rows=3),
+                fitness_decoded_population(population, dataset[0][rows], dataset[1][rows], 'MSE'))
+
+
+def test_whole_dataset_is_streamed_without_sampling(dataset, population):
+    rng = np.random.default_rng(1)
+    state = rng.bit_generator.state
+    assert_same(fitness_decoded_population_subsample(population, *dataset, 'RMSE', 1.0, rng, chunk_rows=7),
+                fitness_decoded_population(population, *dataset, 'RMSE'))
+    assert rng.bit_generator.state == state
+
+
+def test_refined_individuals_get_their_fitness_on_all_rows(dataset, population):
+    fitness = fitness_decoded_population_subsample(population, *dataset, 'RMSE', 0.25, np.random.default_rng(1),
+                                                   refine=0.1, chunk_rows=7)
+    expected = fitness_decoded_population(population, *dataset, 'RMSE')
+    refined = np.isclose(fitness, expected, rtol=1e-12, atol=0.0)
+    assert refined.sum() >= round(len(population) * 0.1)